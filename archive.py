@@ -0,0 +1,236 @@
+"""Cold storage for old applications and assessment results.
+
+Rows older than a configurable age (or applications sitting in a terminal
+status for a shorter one) are moved out of the user shards into a single
+archive database, one zlib-compressed JSON payload per row. Listing
+endpoints only read the archive when the client asks for it.
+
+Archival runs in small batches: each batch is deleted from its shard with
+DELETE ... RETURNING, written to the archive, and only then is the shard
+transaction committed, so an edit racing the archiver is either archived or
+left in place, never lost. Batches are short with a pause in between, so
+request handlers never wait long on a shard's write lock. After a pass,
+shards in incremental auto_vacuum mode are compacted with PRAGMA
+incremental_vacuum and the reclaimed space is reported.
+
+    python archive.py run          # one archival + compaction pass
+"""
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import user_shards
+
+# Column that dates a row, per archived table
+SORT_COLUMNS = {
+    'applications': 'application_date',
+    'user_assessments': 'completed_at',
+}
+
+
+class ArchivePolicy:
+    def __init__(self, after_days=180, terminal_after_days=30,
+                 terminal_statuses=('Rejected', 'Offer Received')):
+        self.after_days = after_days
+        self.terminal_after_days = terminal_after_days
+        self.terminal_statuses = tuple(terminal_statuses)
+
+    def cutoff(self, days):
+        return (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def connect_archive(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute('''CREATE TABLE IF NOT EXISTS archived_rows
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     table_name TEXT,
+                     username TEXT,
+                     source_id INTEGER,
+                     sort_key TEXT,
+                     archived_at TEXT,
+                     payload BLOB, -- zlib-compressed JSON of the original row
+                     UNIQUE (table_name, username, source_id))''')
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_archived_rows_user
+                    ON archived_rows(username, table_name, sort_key)''')
+    conn.commit()
+    return conn
+
+
+# Delete one batch of due rows and return them; the shard transaction is left
+# open for the caller to commit once the rows are safely archived
+def _take_candidates(shard_conn, table, policy, limit):
+    if table == 'applications':
+        placeholders = ', '.join('?' for _ in policy.terminal_statuses) or "''"
+        where = f"application_date < ? OR (status IN ({placeholders}) AND application_date < ?)"
+        params = (policy.cutoff(policy.after_days), *policy.terminal_statuses,
+                  policy.cutoff(policy.terminal_after_days))
+    else:
+        where = "completed_at < ?"
+        params = (policy.cutoff(policy.after_days),)
+    return shard_conn.execute(
+        f'''DELETE FROM {table}
+            WHERE id IN (SELECT id FROM {table} WHERE {where} ORDER BY id LIMIT ?)
+            RETURNING *''',
+        (*params, limit)).fetchall()
+
+
+# Move one batch from a shard into the archive; returns the number of rows moved
+def archive_batch(shard_conn, archive_conn, table, policy, batch_size):
+    try:
+        rows = _take_candidates(shard_conn, table, policy, batch_size)
+        if not rows:
+            shard_conn.rollback()
+            return 0
+
+        # Row ids are unique across shards and survive rebalancing, so a key that is
+        # already archived can only be this same row, left behind by a pass that
+        # stopped before the shard commit below; overwrite it with the current copy
+        archived_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        archive_conn.executemany(
+            '''INSERT INTO archived_rows
+               (table_name, username, source_id, sort_key, archived_at, payload)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (table_name, username, source_id) DO UPDATE SET
+                 sort_key = excluded.sort_key,
+                 archived_at = excluded.archived_at,
+                 payload = excluded.payload''',
+            [(table, row['username'], row['id'], row[SORT_COLUMNS[table]], archived_at,
+              zlib.compress(json.dumps(dict(row)).encode('utf-8'))) for row in rows])
+        archive_conn.commit()
+    except Exception:
+        archive_conn.rollback()
+        shard_conn.rollback()
+        raise
+
+    shard_conn.commit()
+    return len(rows)
+
+
+# Release free pages back to the filesystem, chunk_pages at a time so the write
+# lock is only held briefly; returns bytes reclaimed. Shards not yet switched to
+# auto_vacuum=INCREMENTAL (ShardRouter.init_schema does that) are left alone.
+def compact(conn, chunk_pages=256, pause=0.0):
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    before = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    while free:
+        # executescript steps the pragma to completion; execute() frees a single page
+        conn.executescript(f"PRAGMA incremental_vacuum({chunk_pages})")
+        remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if remaining >= free:
+            break
+        free = remaining
+        time.sleep(pause)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    after = conn.execute("PRAGMA page_count").fetchone()[0]
+    return (before - after) * page_size
+
+
+def run_archival(router, archive_path, policy, batch_size=200, pause=0.05, stop=None):
+    start = time.perf_counter()
+    archived = {table: 0 for table in SORT_COLUMNS}
+    reclaimed = 0
+    archive_conn = connect_archive(archive_path)
+    try:
+        for index in range(router.shard_count):
+            shard_conn = router.connect_index(index)
+            try:
+                for table in SORT_COLUMNS:
+                    while not (stop and stop.is_set()):
+                        moved = archive_batch(shard_conn, archive_conn, table, policy, batch_size)
+                        archived[table] += moved
+                        if moved < batch_size:
+                            break
+                        time.sleep(pause)  # let request handlers at the write lock
+                reclaimed += compact(shard_conn, pause=pause)
+            finally:
+                shard_conn.close()
+    finally:
+        archive_conn.close()
+    return {
+        "archived": archived,
+        "reclaimed_bytes": reclaimed,
+        "elapsed_s": round(time.perf_counter() - start, 3)
+    }
+
+
+# A page of one user's archived rows, newest first, decoded back into dicts.
+# The archive connection is closed when the generator is exhausted or closed.
+def read_archived(archive_path, username, table, offset=0, limit=100):
+    if not os.path.exists(archive_path):
+        return
+    conn = sqlite3.connect(archive_path, timeout=30)
+    try:
+        cursor = conn.execute(
+            '''SELECT payload FROM archived_rows
+               WHERE username = ? AND table_name = ?
+               ORDER BY sort_key DESC, source_id DESC LIMIT ? OFFSET ?''',
+            (username, table, limit, offset))
+        for (payload,) in cursor:
+            yield json.loads(zlib.decompress(payload))
+    finally:
+        conn.close()
+
+
+# Background thread running run_archival every interval seconds
+class Archiver(threading.Thread):
+    def __init__(self, get_router, archive_path, policy, interval, **options):
+        super().__init__(name='archiver', daemon=True)
+        self.get_router = get_router
+        self.archive_path = archive_path
+        self.policy = policy
+        self.interval = interval
+        self.options = options
+        self.last_report = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.last_report = run_archival(self.get_router(), self.archive_path, self.policy,
+                                                stop=self._stop_event, **self.options)
+                print(f"Archival pass: {self.last_report}")
+            except Exception as e:
+                print(f"Error during archival: {str(e)}")
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old rows out of the user shards and compact them.")
+    parser.add_argument('command', choices=['run'])
+    parser.add_argument('--db', default='jobs.db', help="catalog database holding shard_layout")
+    parser.add_argument('--dir', default=os.environ.get('USER_SHARD_DIR', 'shards'))
+    parser.add_argument('--archive', default=os.environ.get('ARCHIVE_DB', 'archive.db'))
+    parser.add_argument('--after-days', type=int, default=int(os.environ.get('ARCHIVE_AFTER_DAYS', 180)))
+    parser.add_argument('--terminal-after-days', type=int,
+                        default=int(os.environ.get('ARCHIVE_TERMINAL_AFTER_DAYS', 30)))
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--pause', type=float, default=0.05, help="seconds between batches")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    shard_count = user_shards.read_shard_count(conn)
+    conn.close()
+    if shard_count is None:
+        parser.error(f"{args.db} has no shard layout yet; start the server once to create it")
+
+    policy = ArchivePolicy(args.after_days, args.terminal_after_days)
+    report = run_archival(user_shards.ShardRouter(args.dir, shard_count), args.archive, policy,
+                          batch_size=args.batch_size, pause=args.pause)
+    print(f"Archived {report['archived']}, reclaimed {report['reclaimed_bytes']} bytes "
+          f"in {report['elapsed_s']}s")
+
+
+if __name__ == '__main__':
+    main()
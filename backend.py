@@ -1,5 +1,5 @@
 from flask import Flask, request, jsonify, send_from_directory
-from flask import send_file
+from flask import send_file, Response
 from fpdf import FPDF
 import sqlite3
 import json
@@ -9,6 +9,22 @@ import datetime
 from functools import wraps
 import os
 import hashlib
+import itertools
+import time
+import threading
+import catalog_snapshot
+from result_cache import ResultCache
+import user_shards
+from events import EventBroker
+import credentials
+import archive
+import traffic_capture
+
+# orjson is optional; it encodes the streamed list endpoints several times faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 app = Flask(__name__, static_url_path='', static_folder='.')
 CORS(app)
@@ -19,17 +35,81 @@ UPLOAD_FOLDER = 'uploads'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = {'pdf'}  # Allowed file extensions for resume
 
+# Read-only, mmap-shared snapshot of the jobs catalog (rebuilt by init_db)
+app.config['CATALOG_SNAPSHOT'] = os.environ.get('CATALOG_SNAPSHOT', 'jobs_catalog.snap')
+
+# Per-user tables (applications, user_assessments) are hash-partitioned across
+# USER_SHARDS SQLite files; jobs.db keeps the catalog and users. The count only
+# applies to a new database, use `python user_shards.py rebalance` to change it.
+app.config['USER_SHARDS'] = int(os.environ.get('USER_SHARDS', 4))
+app.config['USER_SHARD_DIR'] = os.environ.get('USER_SHARD_DIR', 'shards')
+
+# Password hashing runs in a process pool sized by PASSWORD_HASH_WORKERS. The cost is
+# calibrated to PASSWORD_HASH_TARGET_MS unless PASSWORD_HASH_PARAMS pins it
+# (e.g. "scrypt:16384:8:1").
+password_hasher = credentials.PasswordHasher(
+    target_ms=float(os.environ.get('PASSWORD_HASH_TARGET_MS', 50)),
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) or None,
+    max_pending=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 0)) or None,
+    params=credentials.parse_params(os.environ.get('PASSWORD_HASH_PARAMS')))
+
+# Applications older than ARCHIVE_AFTER_DAYS (or ARCHIVE_TERMINAL_AFTER_DAYS once
+# Rejected / Offer Received) and assessment results older than ARCHIVE_AFTER_DAYS
+# move to ARCHIVE_DB every ARCHIVE_INTERVAL_SECONDS (0 turns the job off).
+# List endpoints return them only with ?include_archived=1.
+app.config['ARCHIVE_DB'] = os.environ.get('ARCHIVE_DB', 'archive.db')
+app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))
+app.config['ARCHIVE_TERMINAL_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_TERMINAL_AFTER_DAYS', 30))
+app.config['ARCHIVE_INTERVAL_SECONDS'] = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 3600))
+ARCHIVE_PAGE_SIZE = 100
+ARCHIVE_MAX_PAGE_SIZE = 1000
+
+# Setting TRAFFIC_CAPTURE_DIR records TRAFFIC_CAPTURE_SAMPLE of all requests,
+# sanitized, for benchmarks/replay.py
+app.config['TRAFFIC_CAPTURE_DIR'] = os.environ.get('TRAFFIC_CAPTURE_DIR')
+app.config['TRAFFIC_CAPTURE_SAMPLE'] = float(os.environ.get('TRAFFIC_CAPTURE_SAMPLE', 0.05))
+
 # Database connection helper
 def get_db():
     conn = sqlite3.connect('jobs.db')
     conn.row_factory = sqlite3.Row  # Set row_factory to return rows as dictionaries
     return conn
 
-# Database initialization
-def init_db():
+_shards = None
+_shards_lock = threading.Lock()
+
+# Shard layout of jobs.db, or None when its migrations haven't all run yet
+def _read_shard_layout():
     conn = get_db()
-    c = conn.cursor()
-    
+    try:
+        if _schema_version(conn) < MIGRATIONS[-1][0]:
+            return None
+        shard_count = user_shards.read_shard_count(conn)
+    finally:
+        conn.close()
+    return user_shards.ShardRouter(app.config['USER_SHARD_DIR'], shard_count)
+
+# Servers that import the app (gunicorn, flask run) skip the __main__ block, so
+# the first request runs init_db if `flask --app backend init-db` hasn't
+def get_shards():
+    global _shards
+    if _shards is None:
+        with _shards_lock:
+            if _shards is None:
+                router = _read_shard_layout()
+                if router is None:
+                    init_db()
+                else:
+                    _shards = router
+    return _shards
+
+# Connection to the shard that holds this user's applications and assessments
+def get_user_db(username):
+    return get_shards().connect(username)
+
+# Versioned schema migrations. Each step runs once, inside its own transaction,
+# and is recorded in schema_version so restarts skip straight past it.
+def _migration_create_tables(c):
     # Create jobs table
     c.execute('''CREATE TABLE IF NOT EXISTS jobs
                  (id INTEGER PRIMARY KEY, 
@@ -102,7 +182,42 @@ def init_db():
                   completed_at TEXT, -- Timestamp
                   FOREIGN KEY (username) REFERENCES users(username)
               )''')
-    
+
+def _migration_natural_keys(c):
+    # Earlier versions re-ran the seed inserts on every start; collapse those duplicates
+    c.execute('''DELETE FROM resources WHERE id NOT IN
+                 (SELECT MIN(id) FROM resources GROUP BY url)''')
+    c.execute('''DELETE FROM assessments WHERE id NOT IN
+                 (SELECT MIN(id) FROM assessments GROUP BY skill, question)''')
+    # Only the re-seeded sample rows; real users can legitimately resubmit within a second
+    for seed in SEED_USER_ASSESSMENTS:
+        c.execute('''DELETE FROM user_assessments
+                     WHERE username = ? AND skill = ? AND score = ? AND total_questions = ? AND completed_at = ?
+                       AND id > (SELECT MIN(id) FROM user_assessments
+                                 WHERE username = ? AND skill = ? AND score = ?
+                                   AND total_questions = ? AND completed_at = ?)''',
+                  seed + seed)
+
+    # Natural keys so seeded content can never be inserted twice
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_resources_url ON resources(url)")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_assessments_skill_question ON assessments(skill, question)")
+
+    # Checksums of file-backed seed data (e.g. job_postings.json)
+    c.execute('''CREATE TABLE IF NOT EXISTS seed_state (
+                  name TEXT PRIMARY KEY,
+                  checksum TEXT,
+                  applied_at TEXT
+              )''')
+
+# Sample user assessments, keyed by (username, skill, completed_at)
+SEED_USER_ASSESSMENTS = [
+    ('alice', 'Python', 4, 5, '2025-04-15 10:00:00'),
+    ('alice', 'SQL', 3, 5, '2025-04-16 12:00:00'),
+    ('bob', 'JavaScript', 2, 5, '2025-04-17 09:00:00'),
+    ('charlie', 'Java', 5, 5, '2025-04-18 14:00:00'),
+]
+
+def _migration_seed_content(c):
     # Insert test users
     c.execute('''INSERT OR IGNORE INTO users 
                  (username, password, name, email, skills, job_roles) 
@@ -315,24 +430,90 @@ def init_db():
                  ''')
 
     # Insert sample user assessments
-    c.execute('''INSERT OR IGNORE INTO user_assessments 
-                 (username, skill, score, total_questions, completed_at) 
-                 VALUES 
-                 ('alice', 'Python', 4, 5, '2025-04-15 10:00:00'),
-                 ('alice', 'SQL', 3, 5, '2025-04-16 12:00:00'),
-                 ('bob', 'JavaScript', 2, 5, '2025-04-17 09:00:00'),
-                 ('charlie', 'Java', 5, 5, '2025-04-18 14:00:00')''')
+    for username, skill, score, total_questions, completed_at in SEED_USER_ASSESSMENTS:
+        c.execute('''INSERT INTO user_assessments (username, skill, score, total_questions, completed_at)
+                     SELECT ?, ?, ?, ?, ?
+                     WHERE NOT EXISTS (SELECT 1 FROM user_assessments
+                                       WHERE username = ? AND skill = ? AND completed_at = ?)''',
+                  (username, skill, score, total_questions, completed_at, username, skill, completed_at))
+
+def _migration_shard_user_tables(c):
+    user_shards.create_layout_tables(c)
+    router = user_shards.ShardRouter(app.config['USER_SHARD_DIR'], app.config['USER_SHARDS'])
+    router.init_schema(c)
+
+    # Move existing rows out of jobs.db, ids included, then drop the old tables.
+    # Assessments go oldest first so user_skill_stats folds them in time order.
+    for table, order in (('applications', 'id'), ('user_assessments', 'completed_at, id')):
+        c.execute(f"SELECT * FROM {table} ORDER BY {order}")
+        user_shards.import_rows(router, table, c.fetchall())
+        c.execute(f"DROP TABLE {table}")
+    user_shards.write_shard_count(c, router.shard_count)
+
+def _migration_shard_id_blocks(c):
+    # Per-shard id blocks and rebalance progress; shards get their block in init_db
+    user_shards.create_layout_tables(c)
+
+MIGRATIONS = [
+    (1, 'create base tables', _migration_create_tables),
+    (2, 'dedupe seed rows and add natural keys', _migration_natural_keys),
+    (3, 'seed users, resources and assessments', _migration_seed_content),
+    (4, 'move applications and user_assessments into user shards', _migration_shard_user_tables),
+    (5, 'track shard id blocks and rebalance progress', _migration_shard_id_blocks),
+]
+
+def _schema_version(conn):
+    try:
+        return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+    except sqlite3.OperationalError:  # no schema_version table yet
+        return 0
 
-    # Insert mock data from the JSON file
+def run_migrations(conn):
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+                  version INTEGER PRIMARY KEY,
+                  description TEXT,
+                  applied_at TEXT
+              )''')
+    current = _schema_version(conn)
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        c.execute("BEGIN")
+        try:
+            migrate(c)
+            c.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                      (version, description, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+# Load job_postings.json into the jobs table, but only when the file has changed
+def seed_jobs(conn, path='job_postings.json'):
     try:
-        with open('job_postings.json', 'r') as f:
-            jobs = json.load(f)
+        with open(path, 'rb') as f:
+            raw = f.read()
     except FileNotFoundError:
-        print("job_postings.json not found.")
-        return
+        print(f"{path} not found.")
+        return False
+
+    checksum = hashlib.sha256(raw).hexdigest()
+    c = conn.cursor()
+    c.execute("SELECT checksum FROM seed_state WHERE name = 'jobs'")
+    row = c.fetchone()
+    if row and row['checksum'] == checksum:
+        return False
+
+    try:
+        jobs = json.loads(raw)
     except json.JSONDecodeError:
-        print("Error decoding JSON from job_postings.json.")
-        return
+        print(f"Error decoding JSON from {path}.")
+        return False
 
     for job in jobs:
         c.execute('''INSERT OR REPLACE INTO jobs 
@@ -341,14 +522,95 @@ def init_db():
                   (job['job_id'], job['job_title'], job['company'], 
                    json.dumps(job['required_skills']), job['location'], 
                    job['job_type'], job['experience_level']))
-
+    c.execute("INSERT OR REPLACE INTO seed_state (name, checksum, applied_at) VALUES ('jobs', ?, ?)",
+              (checksum, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
     conn.commit()
+    return True
+
+# Rebuild the catalog snapshot when the jobs table has moved past it
+def build_catalog_snapshot(conn, force=False):
+    c = conn.cursor()
+    c.execute("SELECT checksum FROM seed_state WHERE name = 'jobs'")
+    row = c.fetchone()
+    version = row['checksum'] if row else ''
+    path = app.config['CATALOG_SNAPSHOT']
+    if not force and catalog_snapshot.read_version(path) == version:
+        return False
+    catalog_snapshot.build_snapshot(conn, path, version)
+    return True
+
+_catalog = None
+
+# This worker's view of the catalog snapshot, remapped after an atomic swap
+def get_catalog():
+    global _catalog
+    _catalog = catalog_snapshot.refresh(_catalog, app.config['CATALOG_SNAPSHOT'])
+    return _catalog
+
+# Identifies the current job catalog; changes whenever job_postings.json is reloaded
+def get_catalog_version():
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.version
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("SELECT checksum FROM seed_state WHERE name = 'jobs'")
+    row = c.fetchone()
     conn.close()
+    return row['checksum'] if row else ''
+
+# Held for the whole of init_db, so worker processes starting together take
+# turns and only the first one does any work
+INIT_LOCK_PATH = 'jobs.db-init.lock'
+
+# Database initialization
+def init_db():
+    start = time.perf_counter()
+    lock = sqlite3.connect(INIT_LOCK_PATH, timeout=600, isolation_level=None)
+    lock.execute("BEGIN EXCLUSIVE")
+    conn = get_db()
+    try:
+        applied = run_migrations(conn)
+        pending = user_shards.read_pending_rebalance(conn)
+        if pending:
+            # Rows are split between the old and new layout until it finishes
+            raise RuntimeError(f"shard rebalance {pending[0]} -> {pending[1]} is unfinished; "
+                               f"run `python user_shards.py rebalance --shards {pending[1]}` first")
+        jobs_reloaded = seed_jobs(conn)
+        build_catalog_snapshot(conn, force=jobs_reloaded)
+
+        global _shards
+        router = user_shards.ShardRouter(app.config['USER_SHARD_DIR'], user_shards.read_shard_count(conn))
+        router.init_schema(conn)
+        conn.commit()
+        _shards = router
+    finally:
+        conn.close()
+        lock.close()
+
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"init_db: applied migrations {applied or 'none'}, "
+          f"jobs {'reloaded' if jobs_reloaded else 'unchanged'}, took {elapsed_ms:.1f} ms")
+    return elapsed_ms
+
+# Multi-worker deployments run this once before starting the workers:
+#     flask --app backend init-db && gunicorn -w 4 backend:app
+@app.cli.command('init-db')
+def init_db_command():
+    init_db()
 
 # Check if file extension is allowed
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Username from a JWT; raises if the token is invalid, expired or issued for
+# another scope (login tokens have none, /events URL tokens have 'events')
+def username_from_token(token, scope=None):
+    data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+    if data.get('scope') != scope:
+        raise jwt.InvalidTokenError("token not valid here")
+    return data['username']
+
 # Token required decorator
 def token_required(f):
     @wraps(f)
@@ -358,13 +620,100 @@ def token_required(f):
             return jsonify({"error": "Token is missing"}), 401
         try:
             token = token.split(" ")[1]  # Remove "Bearer" prefix
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            username = data['username']  # Extract username from token
+            username = username_from_token(token)  # Extract username from token
         except:
             return jsonify({"error": "Invalid token"}), 401
         return f(username, *args, **kwargs)  # Pass username to the route
     return decorated
 
+# Username behind a request's bearer token, for pseudonymizing captured traffic
+def _capture_identity(req):
+    token = req.headers.get('Authorization')
+    return username_from_token(token.split(" ")[1]) if token else None
+
+if app.config['TRAFFIC_CAPTURE_DIR']:
+    traffic_capture.TrafficCapture(app.config['TRAFFIC_CAPTURE_DIR'],
+                                   sample=app.config['TRAFFIC_CAPTURE_SAMPLE'],
+                                   identify=_capture_identity,
+                                   user_key=app.config['SECRET_KEY'].encode('utf-8')).init_app(app)
+
+# Rows fetched from the cursor per chunk of a streamed response
+STREAM_BATCH_ROWS = 500
+
+_stream_encoder = json.JSONEncoder(separators=(',', ':'))
+
+def _encode_json(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return _stream_encoder.encode(obj).encode('utf-8')
+
+# Stream a query's rows as they come off the cursor instead of building the
+# whole list first. Clients get a chunked JSON array by default, or NDJSON
+# (one object per line) when they send Accept: application/x-ndjson.
+# to_dict may return None to drop a row. Rows from archived (see
+# archive_page) follow the cursor's, marked "archived": true. The connection is
+# closed once the stream is exhausted or the client goes away.
+def stream_rows(conn, cursor, to_dict, archived=None):
+    ndjson = request.accept_mimetypes.best_match(
+        ['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+    def batches():
+        while True:
+            rows = cursor.fetchmany(STREAM_BATCH_ROWS)
+            if not rows:
+                break
+            yield rows, False
+        if archived is not None:
+            while True:
+                rows = list(itertools.islice(archived, STREAM_BATCH_ROWS))
+                if not rows:
+                    break
+                yield rows, True
+
+    def generate():
+        try:
+            first = True
+            if not ndjson:
+                yield b'['
+            for rows, is_archived in batches():
+                chunk = bytearray()
+                for row in rows:
+                    item = to_dict(row)
+                    if item is None:
+                        continue
+                    if is_archived:
+                        item["archived"] = True
+                    if ndjson:
+                        chunk += _encode_json(item)
+                        chunk += b'\n'
+                    else:
+                        if not first:
+                            chunk += b','
+                        chunk += _encode_json(item)
+                    first = False
+                if chunk:
+                    yield bytes(chunk)
+            if not ndjson:
+                yield b']'
+        finally:
+            conn.close()
+            if archived is not None:
+                archived.close()
+
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return Response(generate(), status=200, mimetype=mimetype)
+
+# Archived rows for ?include_archived=1, paged with archive_offset/archive_limit.
+# Returns None when the client didn't ask; raises ValueError on a bad page.
+def archive_page(username, table):
+    if request.args.get('include_archived', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    offset = int(request.args.get('archive_offset', 0))
+    limit = int(request.args.get('archive_limit', ARCHIVE_PAGE_SIZE))
+    if offset < 0 or not 0 < limit <= ARCHIVE_MAX_PAGE_SIZE:
+        raise ValueError(f"archive_offset must be >= 0 and archive_limit between 1 and {ARCHIVE_MAX_PAGE_SIZE}")
+    return archive.read_archived(app.config['ARCHIVE_DB'], username, table, offset, limit)
+
 # Fetch career resources
 import sqlite3
 import json
@@ -395,39 +744,37 @@ def get_user_info(username):
 @token_required
 def get_resources(username):
     try:
-        conn = get_db()
-        c = conn.cursor()
         skill = request.args.get('skill')
         if not skill:
             return jsonify({"error": "Skill parameter is required"}), 400
 
+        conn = get_db()
+        c = conn.cursor()
         c.execute("SELECT * FROM resources WHERE type IN ('course', 'certification')")
-        resources = c.fetchall()
-        conn.close()
-
-        filtered_resources = []
-        for resource in resources:
-            resource_skills = json.loads(resource['skills'])
-            if skill in resource_skills:
-                filtered_resources.append({
-                    "id": resource['id'],
-                    "type": resource['type'],
-                    "title": resource['title'],
-                    "description": resource['description'],
-                    "url": resource['url'],
-                    "platform": resource['platform'],
-                    "skills": resource_skills,
-                    "job_roles": json.loads(resource['job_roles']),
-                    "difficulty": resource['difficulty'],
-                    "duration": resource['duration'],
-                    "cost": resource['cost']
-                })
-
-        return jsonify(filtered_resources), 200
     except Exception as e:
         print(f"Error fetching resources: {str(e)}")
         return jsonify({"error": f"Failed to fetch resources: {str(e)}"}), 500
 
+    def to_dict(resource):
+        resource_skills = json.loads(resource['skills'])
+        if skill not in resource_skills:
+            return None
+        return {
+            "id": resource['id'],
+            "type": resource['type'],
+            "title": resource['title'],
+            "description": resource['description'],
+            "url": resource['url'],
+            "platform": resource['platform'],
+            "skills": resource_skills,
+            "job_roles": json.loads(resource['job_roles']),
+            "difficulty": resource['difficulty'],
+            "duration": resource['duration'],
+            "cost": resource['cost']
+        }
+
+    return stream_rows(conn, c, to_dict)
+
 # Fetch skill assessment questions
 @app.route('/assessments/<skill>', methods=['GET'])
 @token_required
@@ -472,10 +819,19 @@ def submit_assessment(username):
             if result and selected_option == result['correct_answer']:
                 score += 1
 
+        conn.close()
+
         # Save assessment result
         completed_at = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.execute("INSERT INTO user_assessments (username, skill, score, total_questions, completed_at) VALUES (?, ?, ?, ?, ?)",
-                  (username, skill, score, total_questions, completed_at))
+        conn = get_user_db(username)
+        user_shards.insert_row(conn, 'user_assessments', {
+            "username": username,
+            "skill": skill,
+            "score": score,
+            "total_questions": total_questions,
+            "completed_at": completed_at
+        })
+        user_shards.record_assessment(conn, username, skill, score, total_questions, completed_at)
         conn.commit()
         conn.close()
 
@@ -489,22 +845,52 @@ def submit_assessment(username):
 @token_required
 def get_assessment_history(username):
     try:
-        conn = get_db()
+        try:
+            archived = archive_page(username, 'user_assessments')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        conn = get_user_db(username)
         c = conn.cursor()
         c.execute("SELECT * FROM user_assessments WHERE username = ? ORDER BY completed_at DESC", (username,))
-        history = c.fetchall()
+    except Exception as e:
+        print(f"Error fetching assessment history: {str(e)}")
+        return jsonify({"error": f"Failed to fetch assessment history: {str(e)}"}), 500
+
+    return stream_rows(conn, c, lambda h: {
+        "id": h['id'],
+        "skill": h['skill'],
+        "score": h['score'],
+        "total_questions": h['total_questions'],
+        "completed_at": h['completed_at']
+    }, archived)
+
+# Per-skill progress (attempts, best, latest, averages) from the summary table
+@app.route('/assessments/summary', methods=['GET'])
+@token_required
+def get_assessment_summary(username):
+    try:
+        conn = get_user_db(username)
+        c = conn.cursor()
+        c.execute("SELECT * FROM user_skill_stats WHERE username = ? ORDER BY skill", (username,))
+        stats = c.fetchall()
         conn.close()
 
         return jsonify([{
-            "id": h['id'],
-            "skill": h['skill'],
-            "score": h['score'],
-            "total_questions": h['total_questions'],
-            "completed_at": h['completed_at']
-        } for h in history]), 200
+            "skill": s['skill'],
+            "attempts": s['attempts'],
+            "best_score": s['best_score'],
+            "best_total": s['best_total'],
+            "best_pct": round(s['best_pct'], 2),
+            "latest_score": s['latest_score'],
+            "latest_total": s['latest_total'],
+            "latest_at": s['latest_at'],
+            "average_pct": round(s['pct_sum'] / s['attempts'], 2),
+            "moving_average_pct": round(s['moving_avg_pct'], 2)
+        } for s in stats]), 200
     except Exception as e:
-        print(f"Error fetching assessment history: {str(e)}")
-        return jsonify({"error": f"Failed to fetch assessment history: {str(e)}"}), 500
+        print(f"Error fetching assessment summary: {str(e)}")
+        return jsonify({"error": f"Failed to fetch assessment summary: {str(e)}"}), 500
 
 # Registration endpoint
 @app.route('/register', methods=['POST'])
@@ -515,12 +901,19 @@ def register():
 
     if not username or not password:
         return jsonify({"error": "Username and password are required"}), 400
+    if not isinstance(password, str):
+        return jsonify({"error": "Password must be a string"}), 400
+
+    try:
+        password_hash = password_hasher.hash(password)
+    except credentials.Overloaded:
+        return jsonify({"error": "Server busy, please retry"}), 503
 
     conn = get_db()
     c = conn.cursor()
     
     try:
-        c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
+        c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password_hash))
         conn.commit()
         return jsonify({"message": "User registered successfully"}), 201
     except sqlite3.IntegrityError:
@@ -528,6 +921,14 @@ def register():
     finally:
         conn.close()
 
+# Store a re-hashed password, unless it was changed in the meantime
+def _store_upgraded_password(username, old_hash, new_hash):
+    conn = get_db()
+    conn.execute("UPDATE users SET password = ? WHERE username = ? AND password = ?",
+                 (new_hash, username, old_hash))
+    conn.commit()
+    conn.close()
+
 # Login endpoint
 @app.route('/login', methods=['POST'])
 def login():
@@ -535,13 +936,26 @@ def login():
     username = data.get('username')
     password = data.get('password')
 
+    if not username or not isinstance(password, str) or not password:
+        return jsonify({"error": "Invalid credentials"}), 401
+
     conn = get_db()
     c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, password))
+    c.execute("SELECT password FROM users WHERE username = ?", (username,))
     user = c.fetchone()
     conn.close()
 
-    if user:
+    try:
+        valid, needs_upgrade = password_hasher.verify(password, user['password'] if user else None)
+    except credentials.Overloaded:
+        return jsonify({"error": "Server busy, please retry"}), 503
+
+    if valid:
+        if needs_upgrade:
+            # Plain-text or outdated hash: re-hash off the request path
+            old_hash = user['password']
+            password_hasher.upgrade_async(
+                password, lambda new_hash: _store_upgraded_password(username, old_hash, new_hash))
         token = jwt.encode({
             'username': username,
             'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
@@ -549,8 +963,67 @@ def login():
         return jsonify({"token": token})
     return jsonify({"error": "Invalid credentials"}), 401
 
+# Score a job that already matched the user's desired roles and skills
+def _score_job(skill_match, same_level, location_match, type_match):
+    score = skill_match * 3
+
+    if same_level:
+        score += 4
+
+    if location_match:
+        score += 3
+
+    if type_match:
+        score += 2
+
+    return min(score, 20)
+
+# Recommendations straight from the mmap'd catalog: the profile is resolved to
+# interned string ids once, then only the integer columns are scanned
+def _recommend_from_catalog(catalog, user_skills, desired_roles, preferred_locations,
+                            preferred_job_type, user_experience_level):
+    def lookup(value):
+        return catalog.string_id(value) if isinstance(value, str) else None
+
+    role_titles = {t for t in catalog.title_set
+                   if any(role in catalog.string(t).lower() for role in desired_roles)}
+    skill_ids = {lookup(skill) for skill in user_skills} - {None}
+    if not role_titles or not skill_ids:
+        return []
+    location_ids = {lookup(location) for location in preferred_locations} - {None}
+    job_type_id = lookup(preferred_job_type)
+    level_id = lookup(user_experience_level)
+
+    scored_rows = []
+    titles = catalog.job_title
+    for row in range(len(catalog)):
+        if titles[row] not in role_titles:
+            continue
+        skill_match = len(skill_ids.intersection(catalog.skills(row)))
+        if not skill_match:
+            continue
+        score = _score_job(skill_match,
+                           level_id is not None and catalog.experience_level[row] == level_id,
+                           catalog.location[row] in location_ids,
+                           job_type_id is not None and catalog.job_type[row] == job_type_id)
+        scored_rows.append((row, score))
+
+    scored_rows.sort(key=lambda x: x[1], reverse=True)
+    return [dict(catalog.job(row), score=score) for row, score in scored_rows[:5]]
+
 # Function to generate job recommendations based on user profile
 def get_job_recommendations(user_profile):
+    user_skills = set(user_profile['skills'])
+    desired_roles = [role.lower() for role in user_profile['preferences']['desired_roles']]
+    preferred_locations = set(user_profile['preferences']['locations'])
+    preferred_job_type = user_profile['preferences']['job_type']
+    user_experience_level = user_profile['experience_level']
+
+    catalog = get_catalog()
+    if catalog is not None:
+        return _recommend_from_catalog(catalog, user_skills, desired_roles, preferred_locations,
+                                       preferred_job_type, user_experience_level)
+
     conn = get_db()
     c = conn.cursor()
 
@@ -558,36 +1031,16 @@ def get_job_recommendations(user_profile):
     all_jobs = c.fetchall()
 
     scored_jobs = []
-    user_skills = set(user_profile['skills'])
-    desired_roles = [role.lower() for role in user_profile['preferences']['desired_roles']]
-    preferred_locations = set(user_profile['preferences']['locations'])
-    preferred_job_type = user_profile['preferences']['job_type']
-    user_experience_level = user_profile['experience_level']
-
     for job in all_jobs:
         job_title = job['job_title']
         job_skills = set(json.loads(job['required_skills']))
 
         if any(role in job_title.lower() for role in desired_roles) and user_skills.intersection(job_skills):
-            score = 0
-            job_location = job['location']
-            job_type = job['job_type']
-            job_experience_level = job['experience_level']
-
             skill_match = len(job_skills.intersection(user_skills))
-            score += skill_match * 3
-
-            if job_experience_level == user_experience_level:
-                score += 4
-
-            if job_location in preferred_locations:
-                score += 3
-
-            if job_type == preferred_job_type:
-                score += 2
-
-            score = min(score, 20)
-
+            score = _score_job(skill_match,
+                               job['experience_level'] == user_experience_level,
+                               job['location'] in preferred_locations,
+                               job['job_type'] == preferred_job_type)
             scored_jobs.append((job, score))
 
     scored_jobs.sort(key=lambda x: x[1], reverse=True)
@@ -608,21 +1061,59 @@ def get_job_recommendations(user_profile):
     conn.close()
     return recommendations
 
+# Pub/sub behind /events; buffers are per connection, history is per user
+event_broker = EventBroker(buffer_size=int(os.environ.get('EVENTS_BUFFER_SIZE', 64)),
+                           history_size=int(os.environ.get('EVENTS_HISTORY_SIZE', 64)))
+EVENTS_KEEPALIVE_SECONDS = 15
+EVENTS_RETRY_MS = 3000
+EVENTS_TOKEN_SECONDS = 60
+
+# Cache of /recommend results, keyed by canonical profile and tied to the catalog version
+recommend_cache = ResultCache(maxsize=int(os.environ.get('RECOMMEND_CACHE_SIZE', 1024)))
+
+# Profiles that differ only in list order, duplicates or role casing share a cache key
+def recommend_cache_key(user_profile):
+    preferences = user_profile['preferences']
+    # Sort members by their JSON text: profiles may mix types (e.g. a null skill),
+    # which the recommender accepts but plain sorted() can't compare
+    return json.dumps([
+        sorted(set(user_profile['skills']), key=json.dumps),
+        sorted({role.lower() for role in preferences['desired_roles']}, key=json.dumps),
+        sorted(set(preferences['locations']), key=json.dumps),
+        preferences['job_type'],
+        user_profile['experience_level']
+    ])
+
 # Protected routes
 @app.route('/recommend', methods=['POST'])
 @token_required
 def recommend_jobs(username):
     user_profile = request.json
     try:
-        recommendations = get_job_recommendations(user_profile)
+        key = recommend_cache_key(user_profile)
+        recommendations = recommend_cache.get_or_compute(
+            key, get_catalog_version(), lambda: get_job_recommendations(user_profile))
         return jsonify(recommendations)
     except Exception as e:
         print(f"Error during job recommendation: {str(e)}")
         return jsonify({"error": str(e)}), 400
 
+# Hit/miss counters for tuning RECOMMEND_CACHE_SIZE
+@app.route('/recommend/cache_stats', methods=['GET'])
+@token_required
+def recommend_cache_stats(username):
+    return jsonify(recommend_cache.stats())
+
 @app.route('/metadata', methods=['GET'])
 @token_required
 def get_metadata(username):
+    catalog = get_catalog()
+    if catalog is not None:
+        return jsonify({
+            "skills": [catalog.string(s) for s in catalog.skill_set],
+            "job_roles": [catalog.string(t) for t in catalog.title_set]
+        })
+
     conn = get_db()
     c = conn.cursor()
 
@@ -755,17 +1246,32 @@ def apply_job(username):
         application_date = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         status = "Applied"  # Default status
 
-        conn = get_db()
-        c = conn.cursor()
-        c.execute('''INSERT INTO applications 
-                     (username, job_title, company, location, job_type, experience_level, required_skills, application_date, status) 
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (username, job['job_title'], job['company'], job['location'], 
-                   job['job_type'], job['experience_level'], json.dumps(job['required_skills']), 
-                   application_date, status))
+        conn = get_user_db(username)
+        app_id = user_shards.insert_row(conn, 'applications', {
+            "username": username,
+            "job_title": job['job_title'],
+            "company": job['company'],
+            "location": job['location'],
+            "job_type": job['job_type'],
+            "experience_level": job['experience_level'],
+            "required_skills": json.dumps(job['required_skills']),
+            "application_date": application_date,
+            "status": status
+        })
         conn.commit()
         conn.close()
 
+        event_broker.publish(username, 'application_created', {
+            "id": app_id,
+            "job_title": job['job_title'],
+            "company": job['company'],
+            "location": job['location'],
+            "job_type": job['job_type'],
+            "experience_level": job['experience_level'],
+            "required_skills": job['required_skills'],
+            "application_date": application_date,
+            "status": status
+        })
         return jsonify({"message": "Application submitted successfully"}), 200
     except Exception as e:
         print(f"Error submitting application: {str(e)}")
@@ -776,27 +1282,30 @@ def apply_job(username):
 @token_required
 def get_applications(username):
     try:
-        conn = get_db()
+        try:
+            archived = archive_page(username, 'applications')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        conn = get_user_db(username)
         c = conn.cursor()
         c.execute("SELECT * FROM applications WHERE username = ?", (username,))
-        applications = c.fetchall()
-        conn.close()
-
-        return jsonify([{
-            "id": app['id'],
-            "job_title": app['job_title'],
-            "company": app['company'],
-            "location": app['location'],
-            "job_type": app['job_type'],
-            "experience_level": app['experience_level'],
-            "required_skills": json.loads(app['required_skills']),
-            "application_date": app['application_date'],
-            "status": app['status']
-        } for app in applications]), 200
     except Exception as e:
         print(f"Error fetching applications: {str(e)}")
         return jsonify({"error": f"Failed to fetch applications: {str(e)}"}), 500
 
+    return stream_rows(conn, c, lambda app: {
+        "id": app['id'],
+        "job_title": app['job_title'],
+        "company": app['company'],
+        "location": app['location'],
+        "job_type": app['job_type'],
+        "experience_level": app['experience_level'],
+        "required_skills": json.loads(app['required_skills']),
+        "application_date": app['application_date'],
+        "status": app['status']
+    }, archived)
+
 # Update application status
 @app.route('/applications/<int:app_id>', methods=['PUT'])
 @token_required
@@ -808,7 +1317,7 @@ def update_application(username, app_id):
         if not new_status:
             return jsonify({"error": "Status is required"}), 400
 
-        conn = get_db()
+        conn = get_user_db(username)
         c = conn.cursor()
         c.execute("UPDATE applications SET status = ? WHERE id = ? AND username = ?",
                   (new_status, app_id, username))
@@ -818,6 +1327,7 @@ def update_application(username, app_id):
         conn.commit()
         conn.close()
 
+        event_broker.publish(username, 'application_updated', {"id": app_id, "status": new_status})
         return jsonify({"message": "Application status updated successfully"}), 200
     except Exception as e:
         print(f"Error updating application: {str(e)}")
@@ -828,7 +1338,7 @@ def update_application(username, app_id):
 @token_required
 def delete_application(username, app_id):
     try:
-        conn = get_db()
+        conn = get_user_db(username)
         c = conn.cursor()
         c.execute("DELETE FROM applications WHERE id = ? AND username = ?",
                   (app_id, username))
@@ -838,10 +1348,58 @@ def delete_application(username, app_id):
         conn.commit()
         conn.close()
 
+        event_broker.publish(username, 'application_deleted', {"id": app_id})
         return jsonify({"message": "Application deleted successfully"}), 200
     except Exception as e:
         print(f"Error deleting application: {str(e)}")
         return jsonify({"error": f"Failed to delete application: {str(e)}"}), 500
+
+# Short-lived token for /events?token=, so the login token never ends up in a
+# URL (and with it in access logs). Fetch a new one before each reconnect.
+@app.route('/events/token', methods=['POST'])
+@token_required
+def events_token(username):
+    token = jwt.encode({
+        'username': username,
+        'scope': 'events',
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=EVENTS_TOKEN_SECONDS)
+    }, app.config['SECRET_KEY'])
+    return jsonify({"token": token, "expires_in": EVENTS_TOKEN_SECONDS})
+
+# Server-sent events for the user's application changes. Clients that can set
+# headers send the usual Authorization header; EventSource can't, so it passes
+# a token from POST /events/token as ?token= instead. Reconnecting clients
+# resume from Last-Event-ID.
+@app.route('/events', methods=['GET'])
+def stream_events():
+    if request.headers.get('Authorization'):
+        token, scope = request.headers['Authorization'].split(" ")[-1], None
+    else:
+        token, scope = request.args.get('token'), 'events'
+    if not token:
+        return jsonify({"error": "Token is missing"}), 401
+    try:
+        username = username_from_token(token, scope)
+    except Exception:
+        return jsonify({"error": "Invalid token"}), 401
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscription = event_broker.subscribe(username, last_event_id)
+
+    def generate():
+        try:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n"
+            while True:
+                event = subscription.get(timeout=EVENTS_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield event.encode()
+        finally:
+            subscription.close()
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
     
 @app.route('/generate_resume', methods=['POST'])
 def generate_resume():
@@ -891,5 +1449,10 @@ if __name__ == '__main__':
         os.makedirs(UPLOAD_FOLDER)
     init_db()
     print("Database initialized.")
+    if app.config['ARCHIVE_INTERVAL_SECONDS'] > 0:
+        archive.Archiver(get_shards, app.config['ARCHIVE_DB'],
+                         archive.ArchivePolicy(app.config['ARCHIVE_AFTER_DAYS'],
+                                               app.config['ARCHIVE_TERMINAL_AFTER_DAYS']),
+                         app.config['ARCHIVE_INTERVAL_SECONDS']).start()
     port = int(os.environ.get("PORT", 5000))  # default to 5000 if PORT isn't set
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,129 @@
+"""Per-worker memory of the job catalog: cached sqlite3.Row objects vs the mmap snapshot.
+
+Builds a synthetic jobs table (1M rows by default), then starts WORKERS
+processes per mode. Each worker loads the catalog its way, runs a full
+recommendation-style scan so every page is touched, and reports RSS and PSS
+(proportional set size, which splits shared pages between the processes that
+map them).
+
+    python benchmarks/catalog_rss.py --jobs 1000000 --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import catalog_snapshot  # noqa: E402
+
+SKILLS = ["Python", "SQL", "Java", "JavaScript", "React", "Git", "Docker", "AWS", "Flask",
+          "Machine Learning", "Statistics", "Kubernetes", "Go", "Rust", "C++", "Agile"]
+TITLES = ["Software Engineer", "Data Scientist", "Web Developer", "Product Manager",
+          "DevOps Engineer", "Data Analyst", "Backend Developer", "Mobile Developer"]
+LOCATIONS = ["New York", "Remote", "San Francisco", "Hybrid", "Austin", "Seattle", "Boston"]
+JOB_TYPES = ["Full-time", "Part-time", "Contract", "Internship"]
+LEVELS = ["Entry-level", "Mid-level", "Senior-level"]
+
+
+def build_db(path, n_jobs):
+    rng = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE jobs (id INTEGER PRIMARY KEY, job_title TEXT, company TEXT,
+                    required_skills TEXT, location TEXT, job_type TEXT, experience_level TEXT)''')
+    conn.executemany("INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?)", (
+        (i, rng.choice(TITLES), f"Company {rng.randrange(50000)}",
+         json.dumps(rng.sample(SKILLS, rng.randint(2, 5))), rng.choice(LOCATIONS),
+         rng.choice(JOB_TYPES), rng.choice(LEVELS))
+        for i in range(1, n_jobs + 1)))
+    conn.commit()
+    return conn
+
+
+def memory_kb():
+    usage = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                usage[key] = int(rest.split()[0])
+    return usage
+
+
+def row_cache_worker(db_path, barrier, results):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    jobs = conn.execute("SELECT * FROM jobs").fetchall()
+    skill_sets = [set(json.loads(job['required_skills'])) for job in jobs]
+    wanted = {"Python", "SQL"}
+    matches = sum(1 for job, skills in zip(jobs, skill_sets)
+                  if 'engineer' in job['job_title'].lower() and skills & wanted)
+    barrier.wait()
+    results.put(('row cache', os.getpid(), matches, memory_kb()))
+    barrier.wait()
+
+
+def snapshot_worker(snap_path, barrier, results):
+    catalog = catalog_snapshot.CatalogSnapshot(snap_path)
+    titles = {t for t in catalog.title_set if 'engineer' in catalog.string(t).lower()}
+    wanted = {catalog.string_id("Python"), catalog.string_id("SQL")}
+    matches = sum(1 for row in range(len(catalog))
+                  if catalog.job_title[row] in titles and wanted.intersection(catalog.skills(row)))
+    barrier.wait()
+    results.put(('snapshot', os.getpid(), matches, memory_kb()))
+    barrier.wait()
+
+
+def run_mode(target, path, workers):
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=target, args=(path, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    barrier.wait()  # every worker has loaded the catalog and is still alive
+    reports = [results.get() for _ in procs]
+    barrier.wait()
+    for p in procs:
+        p.join()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'jobs.db')
+        snap_path = os.path.join(tmp, 'jobs_catalog.snap')
+
+        start = time.perf_counter()
+        conn = build_db(db_path, args.jobs)
+        conn.row_factory = sqlite3.Row
+        print(f"built {args.jobs} jobs in {time.perf_counter() - start:.1f}s, "
+              f"db {os.path.getsize(db_path) / 2**20:.1f} MiB")
+
+        start = time.perf_counter()
+        catalog_snapshot.build_snapshot(conn, snap_path, 'bench')
+        conn.close()
+        print(f"built snapshot in {time.perf_counter() - start:.1f}s, "
+              f"{os.path.getsize(snap_path) / 2**20:.1f} MiB")
+
+        for mode, target, path in (('row cache', row_cache_worker, db_path),
+                                   ('snapshot', snapshot_worker, snap_path)):
+            reports = run_mode(target, path, args.workers)
+            rss = [r[3]['Rss'] / 1024 for r in reports]
+            pss = [r[3]['Pss'] / 1024 for r in reports]
+            print(f"{mode:>9}: {args.workers} workers, matches={reports[0][2]}, "
+                  f"RSS/worker {sum(rss) / len(rss):.1f} MiB, PSS/worker {sum(pss) / len(pss):.1f} MiB, "
+                  f"total PSS {sum(pss):.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
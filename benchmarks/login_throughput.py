@@ -0,0 +1,70 @@
+"""Login throughput with pooled password hashing.
+
+Hashes one password with the calibrated parameters, then keeps CLIENTS
+threads calling PasswordHasher.verify (what /login does per request) for
+SECONDS and reports logins/sec overall and per hashing core. Requests
+rejected with Overloaded are counted separately; they are what /login turns
+into 503s.
+
+    python benchmarks/login_throughput.py --target-ms 50 --workers 1 2 4 --clients 16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import credentials  # noqa: E402
+
+
+def run(hasher, stored, clients, seconds):
+    ok = rejected = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        nonlocal ok, rejected
+        while time.perf_counter() < deadline:
+            try:
+                valid, _ = hasher.verify('correct horse battery staple', stored)
+                assert valid
+                with lock:
+                    ok += 1
+            except credentials.Overloaded:
+                with lock:
+                    rejected += 1
+                time.sleep(0.001)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return ok / (time.perf_counter() - start), rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target-ms', type=float, default=50)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    params, ms = credentials.calibrate(args.target_ms)
+    print(f"calibrated {':'.join(str(v) for v in params)} at {ms:.1f} ms/hash "
+          f"({os.cpu_count()} CPUs)")
+
+    for workers in sorted(set(args.workers)):
+        hasher = credentials.PasswordHasher(workers=workers, params=params)
+        stored = hasher.hash('correct horse battery staple')
+        rate, rejected = run(hasher, stored, args.clients, args.seconds)
+        hasher.shutdown()
+        print(f"{workers:>3} workers: {rate:7.1f} logins/s, {rate / workers:6.1f} logins/s/core, "
+              f"{rejected} rejected as overloaded")
+
+
+if __name__ == '__main__':
+    main()
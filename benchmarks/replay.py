@@ -0,0 +1,285 @@
+"""Replay captured production traffic against one or two local builds.
+
+Reads capture files written by traffic_capture.py (TRAFFIC_CAPTURE_DIR) and
+re-sends every replayable request to --target, keeping the captured pacing
+scaled by --speed (0 sends as fast as the workers allow). Each captured user
+becomes a replay user (registered and logged in on every target first), and
+all of a user's requests go through the same worker, so per-user ordering
+matches the capture at any --concurrency.
+
+With --compare, each request is sent to both builds (alternating which goes
+first) and the report shows per-route latency percentiles for both, plus
+responses whose status or JSON payload differ. Start both builds from copies
+of the same jobs.db and shard files, or state-changing requests will diverge.
+
+    python benchmarks/replay.py captures/*.ndjson.gz --target http://127.0.0.1:5000 \\
+        --compare http://127.0.0.1:5001 --speed 4 --concurrency 16
+
+Requests whose bodies were not captured (profile forms, resume uploads),
+/register, and PUT/DELETE /applications/<id> are skipped: the captured ids
+belong to production users, so on a replay user they would only measure the
+404 path. /login is replayed with the replay user's credentials.
+Routes that are random by design (/assessments/<skill> samples its questions)
+always show payload diffs; leave them out with --route or --ignore-key.
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from traffic_capture import read_captures  # noqa: E402
+
+REPLAY_PASSWORD = 'replay-password'
+
+# Routes replay leaves out; see the module docstring
+SKIPPED_ROUTES = {
+    ('POST', '/register'),
+    ('PUT', '/applications/<int:app_id>'),
+    ('DELETE', '/applications/<int:app_id>'),
+}
+
+# Fields that legitimately differ between two runs
+DEFAULT_IGNORE_KEYS = ['token', 'application_date', 'completed_at', 'latest_at']
+
+
+def _request(base, method, path, body=None, token=None, accept=None):
+    url = urllib.parse.urlsplit(base)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+    headers = {'Accept': accept or 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    payload = None
+    if body is not None:
+        payload = json.dumps(body).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+    start = time.perf_counter()
+    try:
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, data, (time.perf_counter() - start) * 1000
+    finally:
+        conn.close()
+
+
+def _decode(data):
+    try:
+        return json.loads(data)
+    except ValueError:
+        pass
+    try:
+        return [json.loads(line) for line in data.splitlines() if line.strip()]
+    except ValueError:
+        return {"_bytes": len(data), "_crc32": zlib.crc32(data)}
+
+
+def _normalize(value, ignore):
+    if isinstance(value, dict):
+        return {k: _normalize(v, ignore) for k, v in value.items() if k not in ignore}
+    if isinstance(value, list):
+        return [_normalize(v, ignore) for v in value]
+    return value
+
+
+# JSON path of the first difference between a and b, or None
+def first_difference(a, b, path='$'):
+    if type(a) is not type(b):
+        return path
+    if isinstance(a, dict):
+        for key in sorted(set(a) | set(b)):
+            if key not in a or key not in b:
+                return f"{path}.{key}"
+            found = first_difference(a[key], b[key], f"{path}.{key}")
+            if found:
+                return found
+        return None
+    if isinstance(a, list):
+        for i, (x, y) in enumerate(zip(a, b)):
+            found = first_difference(x, y, f"{path}[{i}]")
+            if found:
+                return found
+        return f"{path}[{min(len(a), len(b))}]" if len(a) != len(b) else None
+    return None if a == b else path
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * pct / 100))], 2)
+
+
+def _replay_username(user):
+    return f"replay_{user}"
+
+
+# Register (if needed) and log in every replay user; returns {user: token}
+def login_users(base, users):
+    tokens = {}
+    for user in users:
+        credentials = {"username": _replay_username(user), "password": REPLAY_PASSWORD}
+        _request(base, 'POST', '/register', credentials)
+        status, data, _ = _request(base, 'POST', '/login', credentials)
+        if status != 200:
+            raise SystemExit(f"{base}: could not log in {credentials['username']} ({status})")
+        tokens[user] = json.loads(data)['token']
+    return tokens
+
+
+def _build(record):
+    if (record['method'], record['route']) in SKIPPED_ROUTES:
+        return None
+    body = record.get('body')
+    if record['route'] == '/login':
+        body = {"username": _replay_username(record.get('user') or 'anonymous'), "password": REPLAY_PASSWORD}
+    elif body is None and record.get('shape') is not None:
+        return None  # body was not captured
+    query = urllib.parse.urlencode(record.get('args') or {}, doseq=True)
+    path = urllib.parse.quote(record['path']) + (f"?{query}" if query else '')
+    return record['method'], path, body
+
+
+def replay(records, targets, tokens, speed, concurrency):
+    results = []
+    lock = threading.Lock()
+    queues = [queue.Queue() for _ in range(concurrency)]
+
+    def worker(q):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            index, record, (method, path, body) = item
+            order = targets if index % 2 == 0 else targets[::-1]
+            outcome = {}
+            for base in order:
+                status, data, ms = _request(base, method, path, body,
+                                            tokens[base].get(record.get('user')), record.get('accept'))
+                outcome[base] = (status, data, ms)
+            with lock:
+                results.append((record, outcome))
+
+    threads = [threading.Thread(target=worker, args=(q,)) for q in queues]
+    for thread in threads:
+        thread.start()
+
+    skipped = 0
+    first_t = records[0]['t'] if records else 0
+    start = time.perf_counter()
+    for index, record in enumerate(records):
+        request = _build(record)
+        if request is None:
+            skipped += 1
+            continue
+        if speed > 0:
+            delay = (record['t'] - first_t) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        # Same user, same worker: keeps each user's requests in captured order
+        worker_index = hash(record.get('user') or index) % concurrency
+        queues[worker_index].put((index, record, request))
+    for q in queues:
+        q.put(None)
+    for thread in threads:
+        thread.join()
+    return results, skipped, time.perf_counter() - start
+
+
+def report(results, targets, ignore, max_examples):
+    routes = {}
+    mismatches = []
+    for record, outcome in results:
+        route = routes.setdefault(f"{record['method']} {record['route']}",
+                                  {"count": 0, "errors": {base: 0 for base in targets},
+                                   "ms": {base: [] for base in targets}, "mismatches": 0})
+        route["count"] += 1
+        for base, (status, _, ms) in outcome.items():
+            route["ms"][base].append(ms)
+            if status >= 500:
+                route["errors"][base] += 1
+        if len(targets) == 2:
+            (status_a, data_a, _), (status_b, data_b, _) = outcome[targets[0]], outcome[targets[1]]
+            diff = None
+            if status_a != status_b:
+                diff = f"status {status_a} != {status_b}"
+            else:
+                path = first_difference(_normalize(_decode(data_a), ignore), _normalize(_decode(data_b), ignore))
+                if path:
+                    diff = f"payload differs at {path}"
+            if diff:
+                route["mismatches"] += 1
+                if len(mismatches) < max_examples:
+                    mismatches.append({"method": record['method'], "path": record['path'],
+                                       "user": record.get('user'), "diff": diff})
+
+    summary = {}
+    for name, route in sorted(routes.items()):
+        summary[name] = {
+            "count": route["count"],
+            "mismatches": route["mismatches"],
+            "targets": {base: {"p50_ms": _percentile(route["ms"][base], 50),
+                               "p95_ms": _percentile(route["ms"][base], 95),
+                               "p99_ms": _percentile(route["ms"][base], 99),
+                               "errors_5xx": route["errors"][base]} for base in targets}
+        }
+    return summary, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic against local builds.")
+    parser.add_argument('captures', nargs='+', help="*.ndjson.gz files from TRAFFIC_CAPTURE_DIR")
+    parser.add_argument('--target', required=True, help="base URL of the build under test")
+    parser.add_argument('--compare', help="base URL of a second build to diff against")
+    parser.add_argument('--speed', type=float, default=1.0, help="pacing multiplier; 0 = no pacing")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--limit', type=int, help="replay only the first N records")
+    parser.add_argument('--route', action='append', help="only replay these route rules (repeatable)")
+    parser.add_argument('--ignore-key', action='append', default=list(DEFAULT_IGNORE_KEYS),
+                        help="JSON key left out of payload comparison (repeatable)")
+    parser.add_argument('--examples', type=int, default=20, help="mismatches to list")
+    parser.add_argument('--out', help="also write the report as JSON here")
+    args = parser.parse_args()
+
+    records = read_captures(args.captures)
+    if args.route:
+        records = [record for record in records if record['route'] in args.route]
+    records = records[:args.limit]
+    if not records:
+        parser.error("no records to replay")
+
+    targets = [args.target] + ([args.compare] if args.compare else [])
+    users = sorted({record.get('user') or 'anonymous' for record in records})
+    tokens = {base: login_users(base, users) for base in targets}
+    ignore = set(args.ignore_key)
+
+    print(f"Replaying {len(records)} records from {len(users)} users at "
+          f"{'max' if args.speed <= 0 else f'{args.speed:g}x'} speed, concurrency {args.concurrency}")
+    results, skipped, elapsed = replay(records, targets, tokens, args.speed, args.concurrency)
+    summary, mismatches = report(results, targets, ignore, args.examples)
+
+    print(f"Sent {len(results)} requests ({skipped} skipped) in {elapsed:.1f}s")
+    for name, route in summary.items():
+        cells = [f"{name:<40} n={route['count']:<6}"]
+        for base, stats in route["targets"].items():
+            cells.append(f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms 5xx={stats['errors_5xx']}")
+        if args.compare:
+            cells.append(f"diffs={route['mismatches']}")
+        print("  ".join(cells))
+    for mismatch in mismatches:
+        print(f"  mismatch {mismatch['method']} {mismatch['path']} (user {mismatch['user']}): {mismatch['diff']}")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({"targets": targets, "sent": len(results), "skipped": skipped,
+                       "elapsed_s": round(elapsed, 3), "routes": summary, "mismatches": mismatches}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Write throughput of per-user tables as the shard count grows.
+
+WRITERS processes each insert ROWS applications for random users, one
+transaction per insert like apply_job does, routed through
+user_shards.ShardRouter. With one shard every writer queues on the same
+SQLite lock; with more shards, writers for different users proceed in
+parallel.
+
+    python benchmarks/shard_writes.py --writers 8 --rows 500 --shards 1 2 4 8
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import user_shards  # noqa: E402
+
+
+def writer(directory, shard_count, rows, seed, start_event):
+    router = user_shards.ShardRouter(directory, shard_count)
+    rng = random.Random(seed)
+    start_event.wait()
+    for _ in range(rows):
+        username = f"user{rng.randrange(100000)}"
+        conn = router.connect(username)
+        user_shards.insert_row(conn, 'applications', {
+            "username": username,
+            "job_title": "Software Engineer",
+            "company": "Tech Solutions Inc.",
+            "location": "Remote",
+            "job_type": "Full-time",
+            "experience_level": "Mid-level",
+            "required_skills": json.dumps(["Python", "SQL"]),
+            "application_date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "status": "Applied"
+        })
+        conn.commit()
+        conn.close()
+
+
+def run(shard_count, writers, rows):
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        layout = sqlite3.connect(os.path.join(directory, 'layout.db'))
+        user_shards.create_layout_tables(layout)
+        user_shards.ShardRouter(directory, shard_count).init_schema(layout)
+        layout.commit()
+        layout.close()
+        start_event = ctx.Event()
+        procs = [ctx.Process(target=writer, args=(directory, shard_count, rows, seed, start_event))
+                 for seed in range(writers)]
+        for p in procs:
+            p.start()
+        time.sleep(0.5)  # let every writer finish importing before the clock starts
+        start = time.perf_counter()
+        start_event.set()
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+    return writers * rows / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=500, help="inserts per writer")
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    baseline = None
+    for shard_count in args.shards:
+        rate = run(shard_count, args.writers, args.rows)
+        baseline = baseline or rate
+        print(f"{shard_count:>3} shards: {rate:8.0f} writes/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
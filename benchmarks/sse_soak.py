@@ -0,0 +1,106 @@
+"""Soak test for /events: hold many idle SSE connections and check memory stays bounded.
+
+Starts backend.app on a local threaded server, opens CONNECTIONS raw sockets
+to /events (one user per connection), then publishes far more events than
+the per-connection buffer holds without the clients reading a byte. RSS is
+reported after connecting and after the event flood; with bounded buffers
+the flood should add next to nothing.
+
+    python benchmarks/sse_soak.py --connections 10000 --events-per-user 200
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import resource
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_mib():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def raise_fd_limit(wanted):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+
+# Runs in its own process so the server's fd limit only has to cover its own side
+def hold_connections(port, tokens, opened, release):
+    raise_fd_limit(len(tokens) + 256)
+    sockets = []
+    for token in tokens:
+        s = socket.create_connection(('127.0.0.1', port))
+        s.sendall(f"GET /events?token={token} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        s.recv(4096)  # headers and the retry line; keeps the accept backlog from overflowing
+        sockets.append(s)
+    opened.set()
+    release.wait()
+    for s in sockets:
+        s.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--events-per-user', type=int, default=200)
+    args = parser.parse_args()
+
+    raise_fd_limit(args.connections + 256)
+    threading.stack_size(256 * 1024)  # one server thread per idle connection
+
+    import jwt
+    from werkzeug.serving import make_server
+    import backend
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+    print(f"server on :{port}, baseline RSS {rss_mib():.1f} MiB")
+
+    tokens = [jwt.encode({'username': f"soak{i}", 'scope': 'events'}, backend.app.config['SECRET_KEY'])
+              for i in range(args.connections)]
+    ctx = multiprocessing.get_context('spawn')
+    opened, release = ctx.Event(), ctx.Event()
+    client = ctx.Process(target=hold_connections, args=(port, tokens, opened, release))
+
+    start = time.perf_counter()
+    client.start()
+    opened.wait()
+    connected = rss_mib()
+    print(f"{backend.event_broker.connection_count()} connections open in "
+          f"{time.perf_counter() - start:.1f}s, RSS {connected:.1f} MiB")
+
+    start = time.perf_counter()
+    for n in range(args.events_per_user):
+        for i in range(args.connections):
+            backend.event_broker.publish(f"soak{i}", 'application_updated', {"id": n, "status": "Applied"})
+    flooded = rss_mib()
+    total = args.events_per_user * args.connections
+    print(f"published {total} events in {time.perf_counter() - start:.1f}s "
+          f"(buffer {backend.event_broker.buffer_size}/connection), "
+          f"RSS {flooded:.1f} MiB (+{flooded - connected:.1f} MiB, "
+          f"{(flooded - connected) * 1024 / args.connections:.2f} KiB/connection)")
+
+    release.set()
+    client.join()
+    deadline = time.time() + 60
+    while backend.event_broker.connection_count() and time.time() < deadline:
+        time.sleep(0.5)
+    print(f"connections left after close: {backend.event_broker.connection_count()}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
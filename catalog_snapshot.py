@@ -0,0 +1,190 @@
+"""Compact, read-only snapshot of the jobs catalog.
+
+The snapshot is a single columnar file built from the jobs table: one sorted,
+interned string table plus fixed-width integer columns that index into it.
+Workers mmap the file and read the columns through memoryviews, so every
+process shares the same page-cache pages instead of holding its own copy of
+the catalog as sqlite3.Row objects. Integers are stored in native byte order;
+a snapshot is meant to be built and read on the same host.
+"""
+import array
+import json
+import mmap
+import os
+import struct
+
+MAGIC = b'WWCATLG1'
+
+# magic, catalog version, jobs, strings, skill refs, distinct skills, distinct titles, string bytes
+_HEADER = struct.Struct('=8s64sIIIIII')
+
+
+def _align(pos):
+    return (pos + 7) & ~7
+
+
+def _pad(f):
+    f.write(b'\0' * (_align(f.tell()) - f.tell()))
+
+
+# Build a snapshot from the jobs table and atomically swap it into place
+def build_snapshot(conn, path, version):
+    provisional = {}
+
+    def intern(value):
+        return provisional.setdefault(value or '', len(provisional))
+
+    job_ids = array.array('q')
+    columns = {name: array.array('I') for name in
+               ('job_title', 'company', 'location', 'job_type', 'experience_level')}
+    skill_offsets = array.array('I', [0])
+    skill_ids = array.array('I')
+
+    c = conn.cursor()
+    c.execute('''SELECT id, job_title, company, required_skills, location, job_type, experience_level
+                 FROM jobs ORDER BY id''')
+    for job in c:
+        job_ids.append(job['id'])
+        for name, column in columns.items():
+            column.append(intern(job[name]))
+        skill_ids.extend(intern(skill) for skill in json.loads(job['required_skills'] or '[]'))
+        skill_offsets.append(len(skill_ids))
+
+    # Sort the string table so lookups can binary search it in place
+    strings = sorted(provisional, key=lambda s: s.encode('utf-8'))
+    remap = array.array('I', bytes(4 * len(strings)))
+    for new_id, value in enumerate(strings):
+        remap[provisional[value]] = new_id
+    for column in list(columns.values()) + [skill_ids]:
+        for i, old_id in enumerate(column):
+            column[i] = remap[old_id]
+
+    distinct_skills = array.array('I', sorted(set(skill_ids)))
+    distinct_titles = array.array('I', sorted(set(columns['job_title'])))
+
+    blob = bytearray()
+    string_offsets = array.array('I', [0])
+    for value in strings:
+        blob += value.encode('utf-8')
+        string_offsets.append(len(blob))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, version.encode('ascii')[:64], len(job_ids), len(strings),
+                             len(skill_ids), len(distinct_skills), len(distinct_titles), len(blob)))
+        for section in [job_ids, *columns.values(), skill_offsets, skill_ids,
+                        distinct_skills, distinct_titles, string_offsets]:
+            _pad(f)
+            f.write(section.tobytes())
+        _pad(f)
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(job_ids)
+
+
+# Version stored in a snapshot's header, or None if there is no usable snapshot
+def read_version(path):
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < _HEADER.size or header[:8] != MAGIC:
+        return None
+    return _HEADER.unpack(header)[1].rstrip(b'\0').decode('ascii')
+
+
+def _stat_key(st):
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class CatalogSnapshot:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.stat_key = _stat_key(os.fstat(f.fileno()))
+
+        (magic, version, n_jobs, n_strings, n_refs,
+         n_skills, n_titles, blob_len) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        self.path = path
+        self.version = version.rstrip(b'\0').decode('ascii')
+
+        buf = memoryview(self._mm)
+        pos = _HEADER.size
+
+        def take(fmt, count):
+            nonlocal pos
+            pos = _align(pos)
+            size = count * struct.calcsize(fmt)
+            view = buf[pos:pos + size].cast(fmt)
+            pos += size
+            return view
+
+        self.job_ids = take('q', n_jobs)
+        self.job_title = take('I', n_jobs)
+        self.company = take('I', n_jobs)
+        self.location = take('I', n_jobs)
+        self.job_type = take('I', n_jobs)
+        self.experience_level = take('I', n_jobs)
+        self._skill_offsets = take('I', n_jobs + 1)
+        self._skill_ids = take('I', n_refs)
+        self.skill_set = take('I', n_skills)
+        self.title_set = take('I', n_titles)
+        self._string_offsets = take('I', n_strings + 1)
+        self._blob = take('B', blob_len)
+
+    def __len__(self):
+        return len(self.job_ids)
+
+    def string(self, string_id):
+        start, end = self._string_offsets[string_id], self._string_offsets[string_id + 1]
+        return str(self._blob[start:end], 'utf-8')
+
+    # Id of an interned string, or None if the catalog never mentions it
+    def string_id(self, value):
+        target = value.encode('utf-8')
+        lo, hi = 0, len(self._string_offsets) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start, end = self._string_offsets[mid], self._string_offsets[mid + 1]
+            if self._blob[start:end].tobytes() < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self._string_offsets) - 1 and self.string(lo) == value:
+            return lo
+        return None
+
+    def skills(self, row):
+        return self._skill_ids[self._skill_offsets[row]:self._skill_offsets[row + 1]]
+
+    def job(self, row):
+        return {
+            "job_title": self.string(self.job_title[row]),
+            "company": self.string(self.company[row]),
+            "required_skills": [self.string(s) for s in self.skills(row)],
+            "location": self.string(self.location[row]),
+            "job_type": self.string(self.job_type[row]),
+            "experience_level": self.string(self.experience_level[row])
+        }
+
+    # True if the file on disk has been swapped since this snapshot was mapped
+    def is_stale(self):
+        try:
+            return _stat_key(os.stat(self.path)) != self.stat_key
+        except FileNotFoundError:
+            return True
+
+
+# Return an up-to-date snapshot for path, reusing current if the file is unchanged
+def refresh(current, path):
+    if current is not None and not current.is_stale():
+        return current
+    try:
+        return CatalogSnapshot(path)
+    except (FileNotFoundError, ValueError):
+        return None
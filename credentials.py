@@ -0,0 +1,335 @@
+"""Password hashing for register/login.
+
+Passwords are stored as salted scrypt hashes ("scrypt$n$r$p$salt$hash", with
+PBKDF2-SHA256 as the fallback when the OpenSSL build lacks scrypt). The slow
+key derivation runs in a bounded process pool so it never holds up Flask's
+request threads or the GIL; when too many hashes are already queued, callers
+get Overloaded right away instead of piling up behind them. If a worker dies
+(say, OOM-killed), the pool is replaced and the job retried once.
+
+The work factor is calibrated in the pool on first use so one hash takes
+about target_ms on this machine, never going below MIN_PARAMS (which also
+applies until calibration reports back). It is recalibrated, upwards only,
+when hashes get much faster than calibrated. Hashes made with weaker
+parameters, and legacy plain-text passwords, are reported as needing an
+upgrade so login can re-hash them transparently.
+"""
+import base64
+import hashlib
+import hmac
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+SCRYPT_AVAILABLE = hasattr(hashlib, 'scrypt')
+
+# Weakest parameters calibration may settle on
+MIN_PARAMS = {
+    'scrypt': ('scrypt', 1 << 14, 8, 1),
+    'pbkdf2_sha256': ('pbkdf2_sha256', 600000),
+}
+
+
+def _default_algorithm():
+    return 'scrypt' if SCRYPT_AVAILABLE else 'pbkdf2_sha256'
+
+
+class Overloaded(Exception):
+    pass
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode('ascii')
+
+
+def _derive(password, params, salt):
+    start = time.perf_counter()
+    if params[0] == 'scrypt':
+        _, n, r, p = params
+        digest = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                                maxmem=256 * n * r + 1024 * 1024, dklen=32)
+    else:
+        _, iterations = params
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return digest, time.perf_counter() - start
+
+
+def _encode(params, salt, digest):
+    return '$'.join([params[0], *(str(v) for v in params[1:]), _b64(salt), _b64(digest)])
+
+
+# (params, salt, digest), or None for anything that isn't one of our hashes
+# (including legacy plain-text passwords that happen to contain '$')
+def _decode(stored):
+    parts = stored.split('$')
+    try:
+        if parts[0] == 'scrypt' and len(parts) == 6:
+            params = ('scrypt', int(parts[1]), int(parts[2]), int(parts[3]))
+        elif parts[0] == 'pbkdf2_sha256' and len(parts) == 4:
+            params = ('pbkdf2_sha256', int(parts[1]))
+        else:
+            return None
+        return params, base64.b64decode(parts[-2], validate=True), base64.b64decode(parts[-1], validate=True)
+    except ValueError:  # binascii.Error is a ValueError too
+        return None
+
+
+# Relative cost of a parameter set, for "is this hash weaker than current?"
+def _cost(params):
+    if params[0] == 'scrypt':
+        return params[1] * params[2] * params[3]
+    return params[1]
+
+
+# Runs in a pool worker
+def _hash_job(password, params):
+    salt = os.urandom(16)
+    digest, elapsed = _derive(password, params, salt)
+    return _encode(params, salt, digest), elapsed
+
+
+# Runs in a pool worker
+def _verify_job(password, stored):
+    params, salt, expected = _decode(stored)
+    digest, elapsed = _derive(password, params, salt)
+    return hmac.compare_digest(digest, expected), elapsed
+
+
+# Runs in a pool worker
+def _calibrate_job(target_ms):
+    return calibrate(target_ms)
+
+
+# Work factor whose hash time here is closest to target_ms; returns (params, ms)
+def calibrate(target_ms, algorithm=None):
+    algorithm = algorithm or _default_algorithm()
+    if algorithm == 'scrypt':
+        previous = None
+        params = ('scrypt', 1 << 10, 8, 1)
+        while True:
+            _, elapsed = _derive('calibration', params, b'\0' * 16)
+            ms = elapsed * 1000
+            if ms >= target_ms or params[1] >= 1 << 20:
+                # n only comes in powers of two; take whichever side is nearer
+                if previous and target_ms - previous[1] < ms - target_ms:
+                    return previous
+                return params, ms
+            previous = (params, ms)
+            params = ('scrypt', params[1] * 2, 8, 1)
+    params = ('pbkdf2_sha256', 10000)
+    while True:
+        _, elapsed = _derive('calibration', params, b'\0' * 16)
+        ms = elapsed * 1000
+        if ms >= target_ms:
+            # Iterations scale linearly, so land close to the target in one step
+            return ('pbkdf2_sha256', int(params[1] * target_ms / ms)), target_ms
+        params = ('pbkdf2_sha256', params[1] * 2)
+
+
+def _run_callback(on_done, result):
+    try:
+        on_done(result)
+    except Exception as e:
+        print(f"Error in password upgrade callback: {str(e)}")
+
+
+class PasswordHasher:
+    def __init__(self, target_ms=50, workers=None, max_pending=None, params=None):
+        self.target_ms = target_ms
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 8
+        self._fixed_params = params is not None
+        self.params = params or MIN_PARAMS[_default_algorithm()]
+        self._expected_ms = None
+        self._calibrated = self._fixed_params
+        self._calibrating = False
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._callbacks = None
+        self._ewma_ms = None
+        self._samples = 0
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    # A worker that died (e.g. taken by the OOM killer) breaks the whole pool for
+    # good; drop it so the next job starts a fresh one
+    def _discard_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    # Upgrade callbacks write to the database; keep them off the pool's result thread
+    def _get_callbacks(self):
+        with self._lock:
+            if self._callbacks is None:
+                self._callbacks = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-upgrade')
+            return self._callbacks
+
+    def _observe(self, elapsed):
+        with self._lock:
+            ms = elapsed * 1000
+            self._ewma_ms = ms if self._ewma_ms is None else 0.9 * self._ewma_ms + 0.1 * ms
+            self._samples += 1
+            # Only a faster machine triggers a recalibration; slow hashes mostly mean
+            # load, and calibrating under load would pick weaker parameters
+            faster = self._expected_ms is not None and self._ewma_ms < 0.5 * self._expected_ms
+            if faster and self._samples >= 50 and not self._fixed_params and not self._calibrating:
+                self._calibrated = False
+                self._ewma_ms = None
+                self._samples = 0
+
+    # Runs on the pool's result thread; only swaps in the new parameters
+    def _apply_calibration(self, future):
+        with self._lock:
+            self._calibrating = False
+            # A broken pool is replaced on the next job; calibrate again then
+            self._calibrated = not isinstance(future.exception(), BrokenProcessPool)
+            if future.exception() is not None:
+                print(f"Error calibrating password hashing: {str(future.exception())}")
+                return
+            params, ms = future.result()
+            # Never weaker than the floor or than the parameters already in use
+            candidates = [params, MIN_PARAMS[params[0]]]
+            if self.params[0] == params[0]:
+                candidates.append(self.params)
+            chosen = max(candidates, key=_cost)
+            self.params = chosen
+            self._expected_ms = ms * _cost(chosen) / _cost(params)
+
+    def _run(self, fn, *args, pool=None, block=False):
+        if not self._slots.acquire(blocking=block):
+            raise Overloaded("password hashing queue is full")
+        pool = pool or self._get_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except Exception as e:
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._discard_pool(pool)
+            raise
+        future.add_done_callback(lambda f: self._finished(pool, f))
+        return future
+
+    def _finished(self, pool, future):
+        self._slots.release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._discard_pool(pool)
+
+    # Run a job and wait for its result. If the pool breaks under it, the job is
+    # retried once on a fresh pool; after that callers get Overloaded (a 503).
+    def _call(self, fn, *args):
+        for _ in range(2):
+            pool = self._get_pool()
+            try:
+                return self._run(fn, *args, pool=pool).result()
+            except BrokenProcessPool as e:
+                print(f"Password hashing pool broke, restarting it: {str(e)}")
+                self._discard_pool(pool)
+        raise Overloaded("password hashing pool is restarting")
+
+    def hash(self, password):
+        params = self.current_params()
+        result, elapsed = self._call(_hash_job, password, params)
+        if params == self.params:
+            self._observe(elapsed)
+        return result
+
+    # Returns (valid, needs_upgrade)
+    def verify(self, password, stored):
+        decoded = _decode(stored) if stored else None
+        if decoded is None:
+            # Unknown user or legacy plain-text password: still pay for one derivation,
+            # so response times don't tell which usernames exist
+            dummy = _encode(self.current_params(), b'\0' * 16, b'\0' * 32)
+            self._call(_verify_job, password, dummy)
+            if not stored:
+                return False, False
+            return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8')), True
+        ok, elapsed = self._call(_verify_job, password, stored)
+        if decoded[0] == self.current_params():
+            self._observe(elapsed)
+        return ok, ok and self.needs_upgrade(stored)
+
+    # Re-hash in the background and hand the new hash to on_done (on a separate
+    # thread); dropped if the pool is busy
+    def upgrade_async(self, password, on_done):
+        try:
+            future = self._run(_hash_job, password, self.current_params())
+        except (Overloaded, BrokenProcessPool):
+            return False
+        future.add_done_callback(lambda f: self._deliver(f, on_done))
+        return True
+
+    def _deliver(self, future, on_done):
+        if future.exception() is not None:
+            print(f"Error re-hashing password: {str(future.exception())}")
+            return
+        self._get_callbacks().submit(_run_callback, on_done, future.result()[0])
+
+    def needs_upgrade(self, stored):
+        decoded = _decode(stored)
+        if decoded is None:
+            return True
+        params = self.current_params()
+        # Some slack so small recalibration jitter doesn't re-hash everyone
+        return decoded[0][0] != params[0] or _cost(decoded[0]) < 0.75 * _cost(params)
+
+    # Parameters for new hashes. The first call starts calibration in the pool;
+    # until it reports back, the MIN_PARAMS floor is used.
+    def current_params(self):
+        with self._lock:
+            params = self.params
+            start = not self._calibrated and not self._calibrating
+            if start:
+                self._calibrating = True
+        if start:
+            pool = self._get_pool()
+            try:
+                pool.submit(_calibrate_job, self.target_ms).add_done_callback(self._apply_calibration)
+            except Exception as e:
+                with self._lock:
+                    self._calibrating = False
+                if not isinstance(e, BrokenProcessPool):
+                    raise
+                # Keep the current parameters; calibration starts again on the next call
+                self._discard_pool(pool)
+        return params
+
+    def stats(self):
+        with self._lock:
+            return {
+                "params": list(self.params),
+                "calibrated": self._calibrated and not self._fixed_params,
+                "target_ms": self.target_ms,
+                "expected_ms": round(self._expected_ms, 2) if self._expected_ms is not None else None,
+                "observed_ms": round(self._ewma_ms, 2) if self._ewma_ms is not None else None,
+                "workers": self.workers,
+                "max_pending": self.max_pending
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+            if self._callbacks is not None:
+                self._callbacks.shutdown()
+                self._callbacks = None
+
+
+# Parse "scrypt:16384:8:1" or "pbkdf2_sha256:600000" (e.g. from an env var)
+def parse_params(text):
+    if not text:
+        return None
+    name, *values = text.split(':')
+    return (name, *(int(v) for v in values))
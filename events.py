@@ -0,0 +1,150 @@
+"""In-process pub/sub behind the /events server-sent events stream.
+
+Handlers publish per-user events; every open /events connection for that user
+gets its own bounded buffer. Each user's recent events are also kept in a
+short history so a reconnecting client can resume from its Last-Event-ID.
+When a client has missed more than the buffer or history holds, it receives a
+"reset" event instead and should refetch /applications.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Event ids are "<epoch>-<seq>"; a new epoch (process restart) forces a reset on resume
+_EPOCH = f"{int(time.time()):x}{os.getpid():x}"
+
+
+class Event:
+    __slots__ = ('id', 'seq', 'type', 'data')
+
+    def __init__(self, seq, event_type, data):
+        self.id = f"{_EPOCH}-{seq}"
+        self.seq = seq
+        self.type = event_type
+        self.data = data
+
+    def encode(self):
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n"
+
+
+# Tells the client to refetch; carries the newest id so it resumes from there afterwards
+def _reset_event(seq):
+    return Event(seq, 'reset', {"reason": "missed events, refetch /applications"})
+
+
+class _History:
+    __slots__ = ('events', 'dropped_seq')
+
+    def __init__(self, size):
+        self.events = deque(maxlen=size)
+        self.dropped_seq = 0  # newest event that has fallen out of the history
+
+    def append(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.dropped_seq = self.events[0].seq
+        self.events.append(event)
+
+
+class Subscription:
+    def __init__(self, broker, username, buffer_size):
+        self._broker = broker
+        self.username = username
+        self._buffer = deque(maxlen=buffer_size)
+        self._ready = threading.Condition(threading.Lock())
+        self._overflowed = False
+        self.closed = False
+
+    def _put(self, event):
+        with self._ready:
+            if len(self._buffer) == self._buffer.maxlen:
+                self._overflowed = True
+            self._buffer.append(event)
+            self._ready.notify()
+
+    # Next event, or None if nothing arrived within timeout
+    def get(self, timeout=None):
+        with self._ready:
+            if not self._buffer and not self._overflowed:
+                self._ready.wait(timeout)
+            if self._overflowed:
+                # The oldest events were dropped; the client has to resync
+                self._overflowed = False
+                newest = self._buffer[-1].seq
+                self._buffer.clear()
+                return _reset_event(newest)
+            if self._buffer:
+                return self._buffer.popleft()
+            return None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._broker._unsubscribe(self)
+
+
+class EventBroker:
+    def __init__(self, buffer_size=64, history_size=64, history_users=10000):
+        self.buffer_size = buffer_size
+        self.history_size = history_size
+        self.history_users = history_users
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+        self._history = OrderedDict()
+        self._forgotten_seq = 0
+        self._subscribers = {}
+
+    def publish(self, username, event_type, data):
+        with self._lock:
+            event = Event(next(self._seq), event_type, data)
+            self._last_seq = event.seq
+            history = self._history.get(username)
+            if history is None:
+                history = self._history[username] = _History(self.history_size)
+                while len(self._history) > self.history_users:
+                    _, forgotten = self._history.popitem(last=False)
+                    self._forgotten_seq = max(self._forgotten_seq, forgotten.events[-1].seq)
+            else:
+                self._history.move_to_end(username)
+            history.append(event)
+            subscribers = list(self._subscribers.get(username, ()))
+        for subscription in subscribers:
+            subscription._put(event)
+        return event
+
+    def subscribe(self, username, last_event_id=None):
+        subscription = Subscription(self, username, self.buffer_size)
+        with self._lock:
+            self._subscribers.setdefault(username, set()).add(subscription)
+            if last_event_id:
+                for event in self._replay(username, last_event_id):
+                    subscription._put(event)
+        return subscription
+
+    # Events after last_event_id, or a reset if some of them are no longer retained
+    def _replay(self, username, last_event_id):
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != _EPOCH or not seq.isdigit():
+            return [_reset_event(self._last_seq)]
+        seq = int(seq)
+        history = self._history.get(username)
+        if history is None:
+            return [_reset_event(self._last_seq)] if seq < self._forgotten_seq else []
+        if seq < history.dropped_seq:
+            return [_reset_event(self._last_seq)]
+        return [event for event in history.events if event.seq > seq]
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.username)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.username]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
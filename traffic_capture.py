@@ -0,0 +1,203 @@
+"""Opt-in capture of sampled, sanitized production requests.
+
+When enabled, a fraction of requests is recorded as one JSON line each in a
+gzip-compressed NDJSON file, for benchmarks/replay.py to re-drive later:
+
+    {"t": 1760868000.034, "method": "POST", "route": "/recommend", "path": "/recommend",
+     "args": {}, "user": "9f2c41d0a7b3", "shape": {...}, "body": {...},
+     "status": 200, "ms": 3.1, "bytes": 2048}
+
+t is the wall-clock start time (so captures from several worker processes
+can be merged) and ms runs until the response body has been sent (for
+generated files, until the file response is ready). Credentials are never written:
+passwords and tokens are redacted (in bodies and shapes alike), usernames
+are replaced by a hash keyed with user_key (pass the same key to every
+worker process so one user maps to one pseudonym across files), and request
+bodies are only kept for BODY_ROUTES (everything else, e.g. profile forms
+and resume uploads, is recorded as its shape only).
+"""
+import atexit
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from flask import g, request
+
+# Routes whose JSON bodies carry no personal data beyond what is redacted below
+BODY_ROUTES = {
+    ('POST', '/login'),
+    ('POST', '/recommend'),
+    ('POST', '/assessments'),
+    ('POST', '/apply'),
+    ('PUT', '/applications/<int:app_id>'),
+}
+
+# Long-lived or static routes that replay can't use, and /uploads/<filename>,
+# whose paths (resume_<username>_<file>) would put usernames in the capture
+SKIPPED_ENDPOINTS = {'static', 'stream_events', 'home', 'uploaded_file'}
+
+SENSITIVE_KEYS = {'username', 'password', 'token', 'name', 'email', 'contact', 'phone', 'address', 'resume'}
+
+REDACTED = '<redacted>'
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if k.lower() in SENSITIVE_KEYS else _redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_redact(v) for v in value]
+    return value
+
+
+# Types and sizes of a JSON value, without its content. Sensitive keys give
+# away nothing, not even a length.
+def shape(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if k.lower() in SENSITIVE_KEYS else shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [f"list[{len(value)}]"] + ([shape(value[0])] if value else [])
+    if isinstance(value, str):
+        return f"str[{len(value)}]"
+    if value is None:
+        return "null"
+    return type(value).__name__
+
+
+class TrafficCapture:
+    def __init__(self, directory, sample=0.05, identify=None, user_key=None, queue_size=10000):
+        self.sample = sample
+        self.identify = identify
+        self.path = None
+        self.directory = directory
+        self.captured = 0
+        self.dropped = 0
+        self._user_key = user_key or os.urandom(16)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer = None
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        return self
+
+    def _before(self):
+        if request.endpoint in SKIPPED_ENDPOINTS or random.random() >= self.sample:
+            return
+        g.capture_start = time.perf_counter()
+        g.capture_at = time.time()
+
+    def _after(self, response):
+        start = g.pop('capture_start', None)
+        if start is None:
+            return response
+
+        record = {
+            "t": round(g.pop('capture_at'), 4),
+            "method": request.method,
+            "route": request.url_rule.rule if request.url_rule else None,
+            "path": request.path,
+            "args": _redact(request.args.to_dict(flat=False)),
+            "user": self._pseudonym(),
+        }
+        if request.accept_mimetypes.best == 'application/x-ndjson':
+            record["accept"] = 'application/x-ndjson'
+        body = request.get_json(silent=True)
+        if body is not None:
+            record["shape"] = shape(body)
+            if (request.method, record["route"]) in BODY_ROUTES:
+                record["body"] = _redact(body)
+        elif request.content_length:
+            record["shape"] = {"content_type": request.mimetype, "bytes": request.content_length}
+        record["status"] = response.status_code
+
+        # Streamed responses are only finished once the body has gone out
+        def finish():
+            record["ms"] = round((time.perf_counter() - start) * 1000, 3)
+            record["bytes"] = response.content_length
+            self._put(record)
+
+        if response.direct_passthrough:
+            # File responses (generated resumes) skip call_on_close
+            # callbacks; their size is known up front, so record them now
+            finish()
+        else:
+            response.call_on_close(finish)
+        return response
+
+    def _pseudonym(self):
+        if self.identify is None:
+            return None
+        try:
+            username = self.identify(request)
+        except Exception:
+            return None
+        if not username:
+            return None
+        return hmac.new(self._user_key, username.encode('utf-8'), hashlib.sha256).hexdigest()[:12]
+
+    # The file and writer thread are created on the first record, so processes
+    # that import the app without serving requests (e.g. pool workers) leave no files
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self.path = os.path.join(self.directory, f"traffic-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.ndjson.gz")
+                self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+                self._writer = threading.Thread(target=self._write_loop, name='traffic-capture', daemon=True)
+                self._writer.start()
+                atexit.register(self.close)
+
+    def _put(self, record):
+        if self._writer is None:
+            self._start_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # Never make a request wait on the capture file
+            self.dropped += 1
+
+    def _write_loop(self):
+        while True:
+            try:
+                record = self._queue.get(timeout=1)
+            except queue.Empty:
+                self._file.flush()
+                continue
+            if record is None:
+                break
+            self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self.captured += 1
+
+    def close(self):
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+            self._file.close()
+
+    def stats(self):
+        return {"path": self.path, "sample": self.sample,
+                "captured": self.captured, "dropped": self.dropped}
+
+
+# Records of one or more capture files, oldest first. A capture cut short by a
+# crash is read up to its last complete line.
+def read_captures(paths):
+    records = []
+    for path in paths:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    if line.endswith('\n'):
+                        records.append(json.loads(line))
+            except EOFError:
+                pass
+    records.sort(key=lambda record: record['t'])
+    return records
@@ -0,0 +1,391 @@
+"""Hash-partitioned storage for per-user tables.
+
+applications, user_assessments and the user_skill_stats summary live in N
+SQLite shard files picked by a stable hash of the username, so writes from
+different users stop queueing behind one database lock. The read-mostly
+catalog (jobs, resources, assessments, users) stays in jobs.db, which also
+records the current shard count in shard_layout.
+
+Every shard file gets its own block of ids from jobs.db (shard_id_blocks), so
+ids are unique across shards and rows keep them when a rebalance moves them.
+
+To change the shard count, stop the server and run
+
+    python user_shards.py rebalance --shards 8
+
+An interrupted rebalance is recorded in shard_rebalance; the server refuses to
+start until the same command is run again to finish it.
+`python user_shards.py status` prints the row count of every shard.
+"""
+import argparse
+import datetime
+import hashlib
+import os
+import sqlite3
+
+USER_TABLES = ('applications', 'user_assessments', 'user_skill_stats')
+
+# Tables with an id column; user_skill_stats is keyed by (username, skill)
+ID_TABLES = ('applications', 'user_assessments')
+
+# Weight of the newest attempt in user_skill_stats.moving_avg_pct
+MOVING_AVERAGE_ALPHA = 0.3
+
+# Ids of a shard are block << ID_BLOCK_BITS plus a counter. Block 0 holds the ids
+# imported from jobs.db; blocks stay below 2**21 so ids fit in a JavaScript number.
+ID_BLOCK_BITS = 32
+
+
+def _shard_base_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS applications
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     username TEXT,
+                     job_title TEXT,
+                     company TEXT,
+                     location TEXT,
+                     job_type TEXT,
+                     experience_level TEXT,
+                     required_skills TEXT,
+                     application_date TEXT,
+                     status TEXT)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_applications_username ON applications(username)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_assessments
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     username TEXT,
+                     skill TEXT,
+                     score INTEGER, -- Score out of total questions
+                     total_questions INTEGER, -- Total questions in the assessment
+                     completed_at TEXT) -- Timestamp''')
+
+
+def _shard_skill_stats(conn):
+    conn.execute('''CREATE INDEX IF NOT EXISTS idx_user_assessments_username_completed
+                    ON user_assessments(username, completed_at)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_skill_stats
+                    (username TEXT,
+                     skill TEXT,
+                     attempts INTEGER,
+                     best_score INTEGER,
+                     best_total INTEGER,
+                     best_pct REAL,
+                     latest_score INTEGER,
+                     latest_total INTEGER,
+                     latest_at TEXT,
+                     pct_sum REAL, -- For the all-time average
+                     moving_avg_pct REAL, -- Exponential moving average
+                     PRIMARY KEY (username, skill))''')
+
+    # Backfill from the history that is already there
+    rows = conn.execute('''SELECT username, skill, score, total_questions, completed_at
+                           FROM user_assessments ORDER BY completed_at, id''').fetchall()
+    for row in rows:
+        record_assessment(conn, *row)
+
+
+def _shard_id_allocator(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS id_allocator
+                    (table_name TEXT PRIMARY KEY,
+                     block INTEGER,
+                     next_id INTEGER)''')
+
+
+# Schema of every shard, tracked with PRAGMA user_version
+SHARD_MIGRATIONS = [
+    (1, _shard_base_tables),
+    (2, _shard_skill_stats),
+    (3, _shard_id_allocator),
+]
+
+
+def migrate_shard(conn):
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, migrate in SHARD_MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN")
+        try:
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+# Next id from this shard's block; call inside the transaction that inserts the row
+def next_id(conn, table):
+    return conn.execute("UPDATE id_allocator SET next_id = next_id + 1 WHERE table_name = ? RETURNING next_id - 1",
+                        (table,)).fetchone()[0]
+
+
+# Insert a row into applications or user_assessments; returns its id
+def insert_row(conn, table, values):
+    row_id = next_id(conn, table)
+    columns = ['id', *values]
+    conn.execute(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                 (row_id, *values.values()))
+    return row_id
+
+
+# Fold one assessment result into user_skill_stats; call inside the same
+# transaction that inserts the user_assessments row
+def record_assessment(conn, username, skill, score, total_questions, completed_at):
+    pct = 100.0 * score / total_questions if total_questions else 0.0
+    conn.execute('''INSERT INTO user_skill_stats
+                    (username, skill, attempts, best_score, best_total, best_pct,
+                     latest_score, latest_total, latest_at, pct_sum, moving_avg_pct)
+                    VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(username, skill) DO UPDATE SET
+                     attempts = attempts + 1,
+                     best_score = CASE WHEN excluded.best_pct > best_pct THEN excluded.best_score ELSE best_score END,
+                     best_total = CASE WHEN excluded.best_pct > best_pct THEN excluded.best_total ELSE best_total END,
+                     best_pct = MAX(best_pct, excluded.best_pct),
+                     latest_score = excluded.latest_score,
+                     latest_total = excluded.latest_total,
+                     latest_at = excluded.latest_at,
+                     pct_sum = pct_sum + excluded.pct_sum,
+                     moving_avg_pct = ? * excluded.pct_sum + (1 - ?) * moving_avg_pct''',
+                 (username, skill, score, total_questions, pct, score, total_questions,
+                  completed_at, pct, pct, MOVING_AVERAGE_ALPHA, MOVING_AVERAGE_ALPHA))
+
+
+# Stable across processes and restarts, unlike hash()
+def shard_index(username, shard_count):
+    digest = hashlib.blake2b(username.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shard_count
+
+
+class ShardRouter:
+    def __init__(self, directory, shard_count):
+        self.directory = directory
+        self.shard_count = shard_count
+
+    def path(self, index):
+        return os.path.join(self.directory, f"user_shard_{index:03d}.db")
+
+    def connect_index(self, index):
+        conn = sqlite3.connect(self.path(index), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def connect(self, username):
+        return self.connect_index(shard_index(username, self.shard_count))
+
+    # layout_conn is the catalog database (jobs.db); shards without an id block get
+    # one from its shard_id_blocks. The caller commits layout_conn.
+    def init_schema(self, layout_conn):
+        os.makedirs(self.directory, exist_ok=True)
+        unassigned = []
+        for index in range(self.shard_count):
+            conn = self.connect_index(index)
+            # Lets archive.compact hand freed pages back with incremental_vacuum.
+            # Existing shards need one full VACUUM to switch modes.
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            conn.execute("PRAGMA journal_mode=WAL")
+            migrate_shard(conn)
+            row = conn.execute("SELECT block FROM id_allocator LIMIT 1").fetchone()
+            if row is None:
+                unassigned.append(index)
+            else:
+                # Re-record it in case the catalog transaction that handed it out was
+                # rolled back, before any new block is handed out
+                layout_conn.execute('''INSERT OR IGNORE INTO shard_id_blocks (block, shard_file, created_at)
+                                       VALUES (?, ?, ?)''', (row[0], self.path(index), _now()))
+            conn.close()
+
+        for index in unassigned:
+            block = layout_conn.execute("INSERT INTO shard_id_blocks (shard_file, created_at) VALUES (?, ?)",
+                                        (self.path(index), _now())).lastrowid
+            conn = self.connect_index(index)
+            conn.executemany("INSERT INTO id_allocator (table_name, block, next_id) VALUES (?, ?, ?)",
+                             [(table, block, (block << ID_BLOCK_BITS) + 1) for table in ID_TABLES])
+            conn.commit()
+            conn.close()
+
+
+def _now():
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Shard bookkeeping in the catalog database
+def create_layout_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS shard_layout (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    shard_count INTEGER,
+                    updated_at TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS shard_id_blocks (
+                    block INTEGER PRIMARY KEY AUTOINCREMENT,
+                    shard_file TEXT,
+                    created_at TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS shard_rebalance (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    old_count INTEGER,
+                    new_count INTEGER,
+                    started_at TEXT)''')
+
+
+# Current shard count as recorded in the catalog database
+def read_shard_count(conn):
+    row = conn.execute("SELECT shard_count FROM shard_layout WHERE id = 1").fetchone()
+    return row[0] if row else None
+
+
+def write_shard_count(conn, shard_count):
+    conn.execute('''INSERT OR REPLACE INTO shard_layout (id, shard_count, updated_at)
+                    VALUES (1, ?, ?)''',
+                 (shard_count, _now()))
+
+
+# (old_count, new_count) of an unfinished rebalance, or None
+def read_pending_rebalance(conn):
+    row = conn.execute("SELECT old_count, new_count FROM shard_rebalance WHERE id = 1").fetchone()
+    return (row[0], row[1]) if row else None
+
+
+# Copy rows of a user table into their shards, keeping their ids. Safe to re-run.
+def import_rows(router, table, rows):
+    by_shard = {}
+    for row in rows:
+        by_shard.setdefault(shard_index(row['username'], router.shard_count), []).append(row)
+
+    for index, shard_rows in by_shard.items():
+        columns = shard_rows[0].keys()
+        conn = router.connect_index(index)
+        for row in shard_rows:
+            inserted = conn.execute(
+                f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})", tuple(row)).rowcount
+            if inserted and table == 'user_assessments':
+                record_assessment(conn, row['username'], row['skill'], row['score'],
+                                  row['total_questions'], row['completed_at'])
+        conn.commit()
+        conn.close()
+    return sum(len(shard_rows) for shard_rows in by_shard.values())
+
+
+# Copy one row into its new shard unless an earlier, interrupted run already did
+def _copy_row(conn, table, row):
+    values = {name: row[name] for name in row.keys() if name != '_rowid'}
+    placeholders = ', '.join('?' for _ in values)
+    if table not in ID_TABLES:
+        conn.execute(f"INSERT OR REPLACE INTO {table} ({', '.join(values)}) VALUES ({placeholders})",
+                     tuple(values.values()))
+        return
+    existing = conn.execute(f"SELECT * FROM {table} WHERE id = ?", (values['id'],)).fetchone()
+    if existing is None:
+        conn.execute(f"INSERT INTO {table} ({', '.join(values)}) VALUES ({placeholders})",
+                     tuple(values.values()))
+    elif dict(existing) != values:
+        # Ids handed out before shards had id blocks can clash; such a row moves
+        # under a new id, unless an identical copy is already there
+        del values['id']
+        copied = conn.execute(f"SELECT 1 FROM {table} WHERE "
+                              + ' AND '.join(f"{name} IS ?" for name in values),
+                              tuple(values.values())).fetchone()
+        if copied is None:
+            insert_row(conn, table, values)
+
+
+# Move every row whose home shard changes under new_count, keeping its id. Rows
+# are committed in their new shard before being deleted from the old one, and
+# rows already copied are skipped, so re-running after a crash is safe.
+def rebalance(directory, old_count, new_count, layout_conn):
+    target = ShardRouter(directory, new_count)
+    target.init_schema(layout_conn)
+    layout_conn.commit()
+    moved = {table: 0 for table in USER_TABLES}
+
+    for old_index in range(old_count):
+        source = ShardRouter(directory, old_count).connect_index(old_index)
+        for table in USER_TABLES:
+            rows = source.execute(f"SELECT rowid AS _rowid, * FROM {table} ORDER BY rowid").fetchall()
+            leaving = [row for row in rows
+                       if shard_index(row['username'], new_count) != old_index]
+            if not leaving:
+                continue
+
+            by_shard = {}
+            for row in leaving:
+                by_shard.setdefault(shard_index(row['username'], new_count), []).append(row)
+            for new_index, shard_rows in by_shard.items():
+                conn = target.connect_index(new_index)
+                for row in shard_rows:
+                    _copy_row(conn, table, row)
+                conn.commit()
+                conn.close()
+
+            source.executemany(f"DELETE FROM {table} WHERE rowid = ?", [(row['_rowid'],) for row in leaving])
+            source.commit()
+            moved[table] += len(leaving)
+        source.close()
+
+    # Shards beyond the new count are empty now
+    for old_index in range(new_count, old_count):
+        path = ShardRouter(directory, old_count).path(old_index)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return moved
+
+
+def status(directory, shard_count):
+    router = ShardRouter(directory, shard_count)
+    counts = []
+    for index in range(shard_count):
+        conn = router.connect_index(index)
+        counts.append({table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                       for table in USER_TABLES})
+        conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or rebalance the per-user shard files.")
+    parser.add_argument('command', choices=['status', 'rebalance'])
+    parser.add_argument('--shards', type=int, help="new shard count (rebalance)")
+    parser.add_argument('--db', default='jobs.db', help="catalog database holding shard_layout")
+    parser.add_argument('--dir', default=os.environ.get('USER_SHARD_DIR', 'shards'))
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    current = read_shard_count(conn)
+    if current is None:
+        parser.error(f"{args.db} has no shard layout yet; start the server once to create it")
+    pending = read_pending_rebalance(conn)
+
+    if args.command == 'status':
+        if pending:
+            print(f"Rebalance {pending[0]} -> {pending[1]} shards is unfinished; run it again to finish.")
+        for index, counts in enumerate(status(args.dir, current)):
+            print(f"shard {index:03d}: " + ", ".join(f"{t}={n}" for t, n in counts.items()))
+        return
+
+    if pending:
+        old_count, new_count = pending
+        if args.shards and args.shards != new_count:
+            parser.error(f"rebalance {old_count} -> {new_count} is unfinished; finish it with --shards {new_count} first")
+        print(f"Resuming rebalance {old_count} -> {new_count} shards")
+    else:
+        if not args.shards or args.shards < 1:
+            parser.error("rebalance needs --shards N with N >= 1")
+        if args.shards == current:
+            print(f"Already at {current} shards.")
+            return
+        old_count, new_count = current, args.shards
+        conn.execute("INSERT INTO shard_rebalance (id, old_count, new_count, started_at) VALUES (1, ?, ?, ?)",
+                     (old_count, new_count, _now()))
+        conn.commit()
+
+    moved = rebalance(args.dir, old_count, new_count, conn)
+    write_shard_count(conn, new_count)
+    conn.execute("DELETE FROM shard_rebalance WHERE id = 1")
+    conn.commit()
+    conn.close()
+    print(f"Rebalanced {old_count} -> {new_count} shards, moved "
+          + ", ".join(f"{n} {t}" for t, n in moved.items()))
+
+
+if __name__ == '__main__':
+    main()